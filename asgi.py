@@ -0,0 +1,142 @@
+"""ASGI entry point: model-bound routes run on an event loop, everything else on the Flask app.
+
+Run with e.g. ``hypercorn asgi:app`` or ``uvicorn asgi:app``. POSTs to /chat/<id>,
+/save-and-next/<id>, /split-topic/<id> and /topic-cards/<id>/batch are served by
+async views using the AsyncOpenAI client, so a single process can hold hundreds of
+model calls in flight without tying up threads. All other routes go to the unchanged
+Flask app, each request in its own thread, so cheap routes like /check-progress never
+queue behind a slow model call. The plain WSGI app (``backend:app``) keeps working as before.
+"""
+import re
+import asyncio
+from quart import Quart, request, jsonify
+from asgiref.wsgi import WsgiToAsgi
+from asgiref.sync import ThreadSensitiveContext
+import backend
+import tracing
+from backend import post_store
+from topic_speculation import normalize_transcript
+from upstream import AsyncUpstreamClient, create_async_openai_client
+from fake_openai import AsyncFakeOpenAI
+
+ASYNC_ROUTES = re.compile(r'/(chat|save-and-next|split-topic)/\d+|/topic-cards/\d+/batch')
+
+async_app = Quart(__name__)
+
+# Shares the sync client's token bucket, so both paths together stay under the rate limit
+async_client = AsyncUpstreamClient(
+    AsyncFakeOpenAI(latency=backend.FAKE_OPENAI_LATENCY, bitrate=backend.SEGMENT_BITRATE) if backend.OPENAI_BACKEND == 'fake'
+    else create_async_openai_client(timeout=backend.OPENAI_TIMEOUT, max_connections=backend.OPENAI_ASYNC_MAX_CONNECTIONS),
+    max_retries=backend.OPENAI_MAX_RETRIES
+)
+async_client.limiter = backend.client.limiter
+
+async def chat_completion(**params):
+    """Awaitable ``backend.chat_completion``, sharing its response cache"""
+    with tracing.span('chat_completion'):
+        return await backend.llm_cache.complete_async(async_client, **params)
+
+async def map_reduce_topics(transcript, granularity):
+    chunks = backend.topic_chunks(transcript)
+    slots = asyncio.Semaphore(backend.TOPIC_MAP_WORKERS)
+
+    async def extract(chunk):
+        async with slots:
+            return backend.parse_topic_candidates(await chat_completion(**backend.topic_candidates_request(chunk)))
+
+    with tracing.span('topic_map'):
+        candidates_per_chunk = await asyncio.gather(*(extract(chunk) for chunk in chunks))
+    with tracing.span('topic_reduce'):
+        return await chat_completion(**backend.topic_merge_request(candidates_per_chunk, granularity))
+
+async def generate_topic_cards(transcript, granularity=3):
+    with tracing.span('topic_cards'):
+        if len(transcript) > backend.TOPIC_MAP_REDUCE_CHARS:
+            ai_response = await map_reduce_topics(transcript, granularity)
+        else:
+            ai_response = await chat_completion(**backend.topic_cards_request(transcript, granularity))
+    return backend.parse_topic_cards(ai_response, granularity)
+
+@async_app.route('/chat/<int:post_id>', methods=['POST'])
+@backend.json_errors
+async def chat_with_ai(post_id):
+    await asyncio.to_thread(backend.require_post, post_id)
+    message, blog_content = backend.chat_fields(await request.get_json())
+
+    ai_response = await chat_completion(
+        model=backend.TRANSCRIPT_EDITOR_MODEL,
+        messages=backend.transcript_editor_messages(blog_content, message)
+    )
+    await asyncio.to_thread(post_store.update_content, post_id, ai_response)
+
+    return jsonify({'response': ai_response})
+
+@async_app.route('/save-and-next/<int:post_id>', methods=['POST'])
+@backend.json_errors
+async def save_and_next(post_id):
+    await asyncio.to_thread(backend.require_post, post_id)
+    content, granularity = backend.save_fields(await request.get_json())
+
+    await asyncio.to_thread(post_store.update_content, post_id, content)
+
+    # May wait for a speculative generation that is still running, so keep it off the loop
+    topics = await asyncio.to_thread(backend.precomputed_topic_cards, post_id, content, granularity)
+    if topics is None:
+        topics = await generate_topic_cards(normalize_transcript(content), granularity)
+
+    await asyncio.to_thread(post_store.set_topic_cards, post_id, topics)
+
+    return jsonify({
+        'success': True,
+        'nextUrl': backend.app.url_map.bind('').build('view_topic_cards', {'post_id': post_id})
+    })
+
+@async_app.route('/split-topic/<int:post_id>', methods=['POST'])
+@backend.json_errors
+async def split_topic(post_id):
+    data = await request.get_json()
+    card_index = data.get('cardIndex')
+    content = data.get('content')
+
+    await asyncio.to_thread(backend.require_card, post_id, {'op': 'split', 'cardIndex': card_index})
+    topics = backend.parse_split_topics(await chat_completion(**backend.split_topic_request(content)))
+    await asyncio.to_thread(backend.save_split, post_id, card_index, topics)
+
+    return jsonify({
+        'success': True,
+        'message': 'Topic successfully split'
+    })
+
+@async_app.route('/topic-cards/<int:post_id>/batch', methods=['POST'])
+@backend.json_errors
+async def batch_card_operations(post_id):
+    snapshot, operations = await asyncio.to_thread(backend.card_batch, post_id, await request.get_json())
+
+    user = request.remote_addr
+
+    async def run(operation, params):
+        await backend.card_user_limit.acquire_async(user)
+        try:
+            return backend.parse_card_result(operation, await chat_completion(**params))
+        finally:
+            backend.card_user_limit.release(user)
+
+    calls = {position: run(operation, params) for position, operation in enumerate(operations)
+             if (params := backend.card_operation_request(operation, snapshot)) is not None}
+    outcomes = dict(zip(calls, await asyncio.gather(*calls.values(), return_exceptions=True)))
+
+    cards = await asyncio.to_thread(
+        backend.commit_card_operations, post_id, snapshot, operations, backend.card_results(post_id, outcomes))
+    return jsonify({'success': True, 'cards': cards})
+
+flask_app = WsgiToAsgi(backend.app)
+
+async def app(scope, receive, send):
+    if scope['type'] == 'http' and scope['method'] == 'POST' and ASYNC_ROUTES.fullmatch(scope['path']):
+        await async_app(scope, receive, send)
+    elif scope['type'] == 'http':
+        # Each request gets its own thread for sync code instead of sharing one
+        async with ThreadSensitiveContext():
+            await flask_app(scope, receive, send)
+    else:
+        await async_app(scope, receive, send)
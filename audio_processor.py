@@ -1,108 +1,573 @@
+import io
 import os
+import re
+import glob
+import hashlib
+import itertools
+import uuid
 import logging
+import math
+import signal
 import tempfile
 import ffmpeg
-from threading import Lock
+from collections import deque
+from dataclasses import dataclass
+from threading import Thread, Condition
+from progress_store import MemoryProgressStore
+import tracing
+
+@dataclass
+class AudioAnalysis:
+    """Result of probing an upload once, shared by progress reporting and the splitter"""
+    duration: float
+    bit_rate: int
+    codec: str
+    channels: int
+    sample_rate: int
+    encoded_bitrate: int  # What libmp3lame really encodes segments at for this source
+    chunk_duration: float
+    estimated_segments: int
+
+MPEG1_LAYER3_KBPS = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+MPEG2_LAYER3_KBPS = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+MP3_SAMPLE_RATES = sorted(rate for rates in MPEG_SAMPLE_RATES.values() for rate in rates)
+
+def mp3_encoder_settings(sample_rate, bitrate):
+    """(sample_rate, bitrate) libmp3lame really encodes at for a source ``sample_rate`` and requested ``bitrate``.
+
+    ffmpeg resamples to the nearest rate MP3 supports, and LAME rounds the bitrate
+    to the nearest one that rate's MPEG version allows: 32-320k for MPEG-1,
+    8-160k for MPEG-2 and 8-64k for MPEG-2.5 (below 16 kHz).
+    """
+    sample_rate = min(MP3_SAMPLE_RATES, key=lambda rate: abs(rate - (sample_rate or 44100)))
+    version = next(v for v, rates in MPEG_SAMPLE_RATES.items() if sample_rate in rates)
+    if version == 3:
+        allowed = MPEG1_LAYER3_KBPS[1:]
+    else:
+        allowed = [kbps for kbps in MPEG2_LAYER3_KBPS[1:] if version == 2 or kbps <= 64]
+    return sample_rate, min(allowed, key=lambda kbps: abs(kbps * 1000 - bitrate)) * 1000
+
+def parse_mp3_frame_header(buffer, offset=0):
+    """(frame_length, frame_seconds) for an MPEG layer III frame header at ``offset``, or None"""
+    if buffer[offset] != 0xFF or buffer[offset + 1] & 0xE0 != 0xE0:
+        return None
+    version = (buffer[offset + 1] >> 3) & 3
+    layer = (buffer[offset + 1] >> 1) & 3
+    bitrate_index = buffer[offset + 2] >> 4
+    rate_index = (buffer[offset + 2] >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    
+    mpeg1 = version == 3
+    bitrate = (MPEG1_LAYER3_KBPS if mpeg1 else MPEG2_LAYER3_KBPS)[bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+    samples = 1152 if mpeg1 else 576
+    padding = (buffer[offset + 2] >> 1) & 1
+    return samples // 8 * bitrate // sample_rate + padding, samples / sample_rate
+
+def iter_mp3_frames(stream, block_size=64*1024):
+    """Yield (frame_bytes, frame_seconds) for each MP3 frame read from a binary stream"""
+    buffer = bytearray()
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            return
+        buffer += block
+        
+        offset = 0
+        while len(buffer) - offset >= 4:
+            header = parse_mp3_frame_header(buffer, offset)
+            if header is None:
+                offset += 1  # Not a frame boundary (e.g. a tag); resync
+                continue
+            length, seconds = header
+            if len(buffer) - offset < length:
+                break
+            yield bytes(buffer[offset:offset + length]), seconds
+            offset += length
+        del buffer[:offset]
+
+class AudioSegment:
+    """An encoded chunk of audio held in memory, or spilled to a temp file when large"""
+    __slots__ = ('data', 'path')
+
+    def __init__(self, data=None, path=None):
+        self.data = data
+        self.path = path
+
+    def __repr__(self):
+        return f"<AudioSegment {self.path or 'in memory'}, {self.size} bytes>"
+
+    @property
+    def size(self):
+        if self.data is not None:
+            return len(self.data)
+        return os.path.getsize(self.path)
+
+    def open(self):
+        """Binary file object for uploading; in-memory segments are not copied"""
+        if self.data is None:
+            return open(self.path, 'rb')
+        audio_file = io.BytesIO(self.data)
+        audio_file.name = 'segment.mp3'  # The API infers the format from the file name
+        return audio_file
+
+    def sha256(self):
+        digest = hashlib.sha256()
+        if self.data is not None:
+            digest.update(self.data)
+        else:
+            with open(self.path, 'rb') as f:
+                for block in iter(lambda: f.read(1024*1024), b''):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def release(self):
+        """Drop the buffer or delete the spilled file; safe to call more than once"""
+        self.data = None
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+
+class SegmentListReader(Thread):
+    """Collects the segment muxer's list lines, pausing ffmpeg while the consumer is behind.
+
+    The segment muxer writes segments as fast as it can encode. Once ``lookahead``
+    closed segments are waiting to be taken, ffmpeg is stopped with SIGSTOP and
+    continued when one is taken, so at most ``lookahead`` + 1 (the one being
+    written) unclaimed segments are ever on disk. Without SIGSTOP (Windows)
+    ffmpeg is never paused.
+    """
+
+    def __init__(self, process, lookahead):
+        super().__init__(daemon=True)
+        self.process = process
+        self.lookahead = max(1, lookahead)
+        self.lines = deque()
+        self.finished = False
+        self.paused = False
+        self.condition = Condition()
+        self.can_pause = hasattr(signal, 'SIGSTOP')
+
+    def run(self):
+        try:
+            for line in self.process.stdout:
+                with self.condition:
+                    self.lines.append(line)
+                    if self.can_pause and not self.paused and len(self.lines) >= self.lookahead:
+                        self._signal(signal.SIGSTOP)
+                        self.paused = True
+                    self.condition.notify()
+        finally:
+            with self.condition:
+                self.finished = True
+                self.condition.notify()
+
+    def _signal(self, signum):
+        try:
+            self.process.send_signal(signum)
+        except ProcessLookupError:
+            pass  # Already exited
+
+    def __iter__(self):
+        while True:
+            with self.condition:
+                while not self.lines and not self.finished:
+                    self.condition.wait()
+                if not self.lines:
+                    return
+                line = self.lines.popleft()
+                if self.paused and len(self.lines) < self.lookahead:
+                    self._signal(signal.SIGCONT)
+                    self.paused = False
+            yield line
 
 class AudioProcessor:
-    def __init__(self, max_segment_size=24*1024*1024, optimal_duration=180, fallback_duration=90):
+    def __init__(self, max_segment_size=24*1024*1024, optimal_duration=180, fallback_duration=90, single_pass=True,
+                 encode_bitrate=192000, encode_channels=None, progress_store=None,
+                 silence_aware=False, silence_threshold_db=-35, silence_min_duration=0.4, trim_silence=5.0,
+                 in_memory=False, spill_threshold=8*1024*1024, segmenter_lookahead=1):
         self.MAX_SEGMENT_SIZE = max_segment_size
+        self.ENCODE_BITRATE = encode_bitrate  # Bits per second of the MP3 segments sent to Whisper
+        self.ENCODE_CHANNELS = encode_channels  # e.g. 1 to downmix speech to mono; None keeps the source layout
         self.OPTIMAL_DURATION = optimal_duration
         self.FALLBACK_DURATION = fallback_duration
-        self.progress_data = {}
-        self.progress_lock = Lock()
+        self.single_pass = single_pass  # One ffmpeg segment-muxer pass instead of one process per chunk
+        self.silence_aware = silence_aware  # Cut chunks in pauses and drop long silences
+        self.SILENCE_THRESHOLD_DB = silence_threshold_db
+        self.SILENCE_MIN_DURATION = silence_min_duration
+        self.TRIM_SILENCE = trim_silence  # Silences at least this long (seconds) are not sent to Whisper
+        self.in_memory = in_memory  # Encode to ffmpeg's stdout and keep segments in memory instead of temp files
+        self.SPILL_THRESHOLD = spill_threshold  # In-memory segments larger than this are written to a temp file
+        self.SEGMENTER_LOOKAHEAD = segmenter_lookahead  # Closed segments the disk segmenter may keep ahead of the consumer
+        self.progress_store = progress_store or MemoryProgressStore()
 
-    def update_progress(self, session_id, current, total, status=None):
+    def update_progress(self, session_id, current, total, status=None, **extra):
         """Update progress for a given session with thread safety"""
-        with self.progress_lock:
-            self.progress_data[session_id] = {
-                'current': current,
-                'total': total,
-                'percentage': int((current / total) * 100) if total > 0 else 0,
-                'status': status or 'Processing...'
-            }
+        self.progress_store.set(session_id, {
+            'current': current,
+            'total': total,
+            'percentage': int((current / total) * 100) if total > 0 else 0,
+            'status': status or 'Processing...',
+            **extra
+        })
+
+    def set_progress_fields(self, session_id, **fields):
+        """Merge fields into an existing session's progress (e.g. final status or error)"""
+        self.progress_store.merge(session_id, fields)
+
+    def publish_segment(self, session_id, start, end, text):
+        """Record a finished segment's transcript so streaming clients can show it early"""
+        self.progress_store.append_segment(session_id, {'start': start, 'end': end, 'text': text})
+
+    def clear_segments(self, session_id):
+        """Forget a session's published segments, e.g. before a resumed job publishes them again"""
+        self.progress_store.clear_segments(session_id)
 
     def get_progress(self, session_id):
         """Get progress for a session"""
-        with self.progress_lock:
-            return self.progress_data.get(session_id)
+        return self.progress_store.get(session_id)
 
-    def split_audio_streaming(self, file_path):
-        """Split audio file into chunks, streaming with ffmpeg"""
-        try:
+    def wait_for_progress(self, session_id, since_version, segments_seen=0, timeout=15):
+        """Block until the session's progress changes past ``since_version`` or the timeout expires.
+
+        Returns (version, progress, new_segments), where new_segments are the partial
+        transcripts published after the first ``segments_seen``.
+        """
+        return self.progress_store.wait(session_id, since_version, segments_seen, timeout)
+
+    @property
+    def encode_bitrate_arg(self):
+        return f"{self.ENCODE_BITRATE // 1000}k"
+
+    @property
+    def encode_args(self):
+        """ffmpeg output options for the MP3 segments sent to Whisper"""
+        # 'b:a', not 'b': libmp3lame ignores the bare (video) bitrate and falls back to 128k
+        args = {'acodec': 'libmp3lame', 'b:a': self.encode_bitrate_arg}
+        if self.ENCODE_CHANNELS:
+            args['ac'] = self.ENCODE_CHANNELS
+        return args
+
+    def analyze_audio(self, file_path):
+        """Probe the file once and pick a chunk duration from the predicted encoded size"""
+        with tracing.span('probe'):
             probe = ffmpeg.probe(file_path)
-            duration = float(probe['format']['duration'])
-            
-            # Test first chunk
-            with tempfile.NamedTemporaryFile(suffix='.mp3') as test_file:
-                stream = ffmpeg.input(file_path, ss=0, t=self.OPTIMAL_DURATION)
-                stream = ffmpeg.output(stream, test_file.name, 
-                    acodec='libmp3lame', 
-                    b='192k',
-                    loglevel='error'
-                )
-                ffmpeg.run(stream, overwrite_output=True)
-                use_smaller_chunks = os.path.getsize(test_file.name) >= self.MAX_SEGMENT_SIZE
-            
-            chunk_duration = self.FALLBACK_DURATION if use_smaller_chunks else self.OPTIMAL_DURATION
-            logging.info(f"Using {chunk_duration}s chunks based on initial test")
+        audio_stream = next((s for s in probe.get('streams', []) if s.get('codec_type') == 'audio'), {})
+        duration = float(probe['format']['duration'])
+        bit_rate = int(audio_stream.get('bit_rate') or probe['format'].get('bit_rate') or 0)
+        sample_rate = int(audio_stream.get('sample_rate') or 0)
+        
+        # Segments are re-encoded as CBR MP3, so their size follows from the bitrate the
+        # encoder settles on for this source's sample rate; the source bitrate and channel
+        # count don't change it, and no trial encode is needed
+        _, encoded_bitrate = mp3_encoder_settings(sample_rate, self.ENCODE_BITRATE)
+        predicted_size = encoded_bitrate / 8 * self.OPTIMAL_DURATION * 1.05  # Container/frame overhead
+        chunk_duration = self.FALLBACK_DURATION if predicted_size >= self.MAX_SEGMENT_SIZE else self.OPTIMAL_DURATION
+        
+        analysis = AudioAnalysis(
+            duration=duration,
+            bit_rate=bit_rate,
+            codec=audio_stream.get('codec_name', 'unknown'),
+            channels=int(audio_stream.get('channels') or 0),
+            sample_rate=sample_rate,
+            encoded_bitrate=encoded_bitrate,
+            chunk_duration=chunk_duration,
+            estimated_segments=max(1, math.ceil(duration / chunk_duration))
+        )
+        logging.info(f"Analyzed {file_path}: {analysis}")
+        return analysis
+
+    def split_audio_streaming(self, file_path, analysis=None, ranges=None, on_skip=None):
+        """Split audio file into chunks, streaming with ffmpeg.
+
+        Yields (AudioSegment, start, end) with times in seconds from the start of
+        the file; the consumer calls ``release()`` on each segment when done.
+        ``ranges`` limits splitting to those (start, end) spans, e.g. the parts of
+        a failed job that still need transcribing. ``on_skip(start, end)`` is
+        called for each span left out because it is silence.
+        """
+        try:
+            if analysis is None:
+                analysis = self.analyze_audio(file_path)
+            duration = analysis.duration
+            chunk_duration = analysis.chunk_duration
+            logging.info(f"Using {chunk_duration}s chunks")
             
-            current_time = 0
-            while current_time < duration:
-                with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-                    try:
-                        stream = ffmpeg.input(file_path, ss=current_time, t=chunk_duration)
-                        stream = ffmpeg.output(stream, temp_file.name, 
-                            acodec='libmp3lame', 
-                            b='192k',
-                            loglevel='error'
-                        )
-                        ffmpeg.run(stream, overwrite_output=True)
-                        
-                        if os.path.getsize(temp_file.name) >= self.MAX_SEGMENT_SIZE:
-                            os.unlink(temp_file.name)
-                            for subchunk in range(2):
-                                with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as sub_file:
-                                    substream = ffmpeg.input(file_path, 
-                                        ss=current_time + (subchunk * (chunk_duration/2)), 
-                                        t=chunk_duration/2
-                                    )
-                                    substream = ffmpeg.output(substream, sub_file.name,
-                                        acodec='libmp3lame',
-                                        b='192k',
-                                        loglevel='error'
-                                    )
-                                    ffmpeg.run(substream, overwrite_output=True)
-                                    yield sub_file.name
-                        else:
-                            yield temp_file.name
-                    
-                    except ffmpeg.Error as e:
-                        logging.error(f"FFmpeg error: {e.stderr.decode()}")
-                        raise
+            for start, end in ranges or [(0, duration)]:
+                if self.silence_aware:
+                    runs = self.plan_chunks(file_path, start, end, chunk_duration)
+                else:
+                    runs = [(start, end, None)]
                 
-                current_time += chunk_duration
+                if on_skip:
+                    covered = start
+                    for run_start, run_end, _ in runs + [(end, end, None)]:
+                        if run_start > covered:
+                            on_skip(covered, run_start)
+                        covered = max(covered, run_end)
+                
+                for run_start, run_end, cuts in runs:
+                    if self.in_memory:
+                        chunks = self.split_audio_in_memory(file_path, chunk_duration, run_start, run_end, cuts)
+                    elif self.single_pass or cuts is not None:
+                        chunks = self.split_audio_single_pass(file_path, chunk_duration, run_start, run_end, cuts)
+                    else:
+                        chunks = self.split_audio_per_chunk(file_path, run_end, chunk_duration, run_start)
+                    for segment, segment_start, segment_end in chunks:
+                        self.check_segment_size(segment, segment_end - segment_start, analysis)
+                        yield segment, segment_start, segment_end
                 
         except Exception as e:
             logging.error(f"Error in split_audio_streaming: {str(e)}")
             raise
 
-    def get_audio_duration(self, file_path):
-        """Get audio file duration and determine chunk size"""
-        probe = ffmpeg.probe(file_path)
-        duration = float(probe['format']['duration'])
+    def predicted_segment_size(self, seconds, analysis):
+        return analysis.encoded_bitrate / 8 * seconds
+
+    def check_segment_size(self, segment, seconds, analysis, tolerance=0.05):
+        """Warn when an encoded segment's size is off the prediction chunk sizing relied on"""
+        predicted = self.predicted_segment_size(seconds, analysis)
+        # Each segment carries a frame or two of headers, which dominate very short ones
+        if abs(segment.size - predicted) > predicted * tolerance + 2048:
+            logging.warning(f"Segment of {seconds:.1f}s is {segment.size} bytes, predicted {predicted:.0f} "
+                            f"at {analysis.encoded_bitrate}bps; chunk sizing may not keep under MAX_SEGMENT_SIZE")
+
+    def detect_silences(self, file_path, start=0, end=None):
+        """(start, end) spans quieter than SILENCE_THRESHOLD_DB for at least SILENCE_MIN_DURATION seconds"""
+        input_args = {'ss': start} if start else {}
+        if end is not None:
+            input_args['t'] = end - start
+        stream = ffmpeg.input(file_path, **input_args).filter(
+            'silencedetect', noise=f"{self.SILENCE_THRESHOLD_DB}dB", d=self.SILENCE_MIN_DURATION
+        )
+        try:
+            with tracing.span('silence_detect'):
+                _, stderr = ffmpeg.output(stream, '-', f='null').global_args('-nostats').run(capture_stderr=True)
+        except ffmpeg.Error as e:
+            logging.error(f"FFmpeg error: {e.stderr.decode()}")
+            raise
+        
+        silences, silence_start = [], None
+        for match in re.finditer(r'silence_(start|end): (-?[\d.]+)', stderr.decode(errors='replace')):
+            time_offset = start + max(0.0, float(match.group(2)))
+            if match.group(1) == 'start':
+                silence_start = time_offset
+            elif silence_start is not None:
+                silences.append((silence_start, time_offset))
+                silence_start = None
+        if silence_start is not None and end is not None:
+            silences.append((silence_start, end))
+        return silences
+
+    def plan_chunks(self, file_path, start, end, chunk_duration, padding=0.25):
+        """Plan chunk boundaries inside pauses.
+
+        Returns runs of (run_start, run_end, cut_times): each run is contiguous
+        audio encoded by one ffmpeg process and cut at ``cut_times``. Silences of
+        at least TRIM_SILENCE seconds fall between runs and are never encoded.
+        Cuts go in the longest pause in the last 40% of each chunk, falling back
+        to a hard cut at ``chunk_duration`` when there is no pause.
+        """
+        silences = self.detect_silences(file_path, start, end)
         
-        with tempfile.NamedTemporaryFile(suffix='.mp3') as test_file:
-            stream = ffmpeg.input(file_path, ss=0, t=self.OPTIMAL_DURATION)
-            stream = ffmpeg.output(stream, test_file.name, 
-                acodec='libmp3lame', 
-                b='192k',
-                loglevel='error'
-            )
-            ffmpeg.run(stream, overwrite_output=True)
-            use_smaller_chunks = os.path.getsize(test_file.name) >= self.MAX_SEGMENT_SIZE
+        # Long silences split the range into islands of speech
+        islands, position = [], start
+        for silence_start, silence_end in silences:
+            if silence_end - silence_start >= self.TRIM_SILENCE:
+                islands.append((position, silence_start + padding))
+                position = silence_end - padding
+        islands.append((position, end))
+        
+        runs = []
+        for island_start, island_end in islands:
+            if island_end - island_start < 1.0:
+                continue
+            
+            cuts, chunk_start = [], island_start
+            while island_end - chunk_start > chunk_duration:
+                window_start, window_end = chunk_start + chunk_duration * 0.6, chunk_start + chunk_duration
+                pauses = [(e - s, (s + e) / 2) for s, e in silences if window_start <= (s + e) / 2 <= window_end]
+                cut = max(pauses)[1] if pauses else window_end
+                cuts.append(cut)
+                chunk_start = cut
+            runs.append((island_start, island_end, cuts))
+        
+        trimmed = sum(e - s for s, e in silences if e - s >= self.TRIM_SILENCE)
+        logging.info(f"Planned {sum(len(c) + 1 for _, _, c in runs)} chunks in {len(runs)} runs "
+                     f"for {start:.0f}-{end:.0f}s ({trimmed:.0f}s of silence trimmed)")
+        return runs
+
+    def split_audio_single_pass(self, file_path, chunk_duration, start=0, end=None, cut_times=None):
+        """Decode the source once with ffmpeg's segment muxer, yielding each chunk as it closes.
+
+        Chunks are ``chunk_duration`` long, or cut at the absolute ``cut_times`` if given.
+        """
+        segments = self._run_segmenter(file_path, chunk_duration, start, end, cut_times, **self.encode_args)
+        for segment_path, segment_start, segment_end in segments:
+            if os.path.getsize(segment_path) < self.MAX_SEGMENT_SIZE:
+                yield AudioSegment(path=segment_path), segment_start, segment_end
+                continue
+            
+            # Oversized chunk: cut the already-encoded MP3 in half without re-encoding
+            try:
+                for half_path, half_start, half_end in self._run_segmenter(segment_path, chunk_duration / 2, acodec='copy'):
+                    yield AudioSegment(path=half_path), segment_start + half_start, segment_start + half_end
+            finally:
+                os.unlink(segment_path)
+
+    def _run_segmenter(self, file_path, segment_time, start=0, end=None, cut_times=None, **codec_args):
+        """Run one ffmpeg segment-muxer process and yield (path, start, end) in order as segments are closed.
+
+        ffmpeg is paused while SEGMENTER_LOOKAHEAD closed segments wait to be
+        taken, so the caller's own bound on pending segments also bounds disk use.
+        """
+        prefix = os.path.join(tempfile.gettempdir(), f"segment_{uuid.uuid4().hex}_")
+        input_args = {'ss': start} if start else {}
+        if end is not None:
+            input_args['t'] = end - start
+        if cut_times:
+            codec_args['segment_times'] = ','.join(f"{t - start:.3f}" for t in cut_times)
+        else:
+            codec_args['segment_time'] = segment_time
+        stream = ffmpeg.input(file_path, **input_args)
+        stream = ffmpeg.output(stream, f"{prefix}%05d.mp3",
+            f='segment',
+            reset_timestamps=1,
+            segment_list='pipe:1',
+            segment_list_type='csv',
+            loglevel='error',
+            **codec_args
+        )
+        process = ffmpeg.run_async(stream, pipe_stdout=True, pipe_stderr=True, overwrite_output=True)
+        segment_list = SegmentListReader(process, self.SEGMENTER_LOOKAHEAD)
+        segment_list.start()
+        yielded = set()
+        try:
+            # ffmpeg appends "filename,start,end" to the segment list each time a segment is closed
+            for line in segment_list:
+                name, segment_start, segment_end = line.decode().strip().rsplit(',', 2)
+                segment_path = os.path.join(os.path.dirname(prefix), os.path.basename(name.strip('"')))
+                yielded.add(segment_path)
+                yield segment_path, start + float(segment_start), start + float(segment_end)
+            
+            stderr = process.stderr.read()
+            if process.wait() != 0:
+                logging.error(f"FFmpeg error: {stderr.decode()}")
+                raise ffmpeg.Error('ffmpeg', None, stderr)
+        finally:
+            if process.poll() is None:
+                process.kill()  # Also ends a stopped process
+                process.wait()
+            segment_list.join()
+            process.stdout.close()
+            process.stderr.close()
+            # Remove segments ffmpeg wrote but we never handed out (e.g. generator abandoned)
+            for leftover in glob.glob(f"{glob.escape(prefix)}*.mp3"):
+                if leftover not in yielded:
+                    os.unlink(leftover)
+
+    def split_audio_in_memory(self, file_path, chunk_duration, start=0, end=None, cut_times=None):
+        """Encode once to MP3 on ffmpeg's stdout and cut the stream into in-memory segments.
+
+        Cuts fall on MP3 frame boundaries, so each segment is a valid MP3 file
+        without re-encoding. Chunks are ``chunk_duration`` long, or cut at the
+        absolute ``cut_times`` if given; a chunk is also closed early before it
+        would reach MAX_SEGMENT_SIZE. Nothing is written to disk unless a
+        segment exceeds SPILL_THRESHOLD.
+        """
+        input_args = {'ss': start} if start else {}
+        if end is not None:
+            input_args['t'] = end - start
+        stream = ffmpeg.input(file_path, **input_args)
+        stream = ffmpeg.output(stream, 'pipe:1',
+            f='mp3',
+            write_xing=0,
+            id3v2_version=0,
+            loglevel='error',
+            **self.encode_args
+        )
+        process = ffmpeg.run_async(stream, pipe_stdout=True, pipe_stderr=True)
         
-        chunk_duration = self.FALLBACK_DURATION if use_smaller_chunks else self.OPTIMAL_DURATION
-        estimated_segments = max(1, int(duration / chunk_duration) + 1)
+        if cut_times is not None:
+            boundaries = iter([t - start for t in cut_times])
+        else:
+            boundaries = itertools.count(chunk_duration, chunk_duration)
+        next_cut = next(boundaries, None)
         
-        return duration, estimated_segments, chunk_duration
\ No newline at end of file
+        try:
+            buffer = bytearray()
+            segment_start = elapsed = 0.0
+            for frame, frame_seconds in iter_mp3_frames(process.stdout):
+                at_cut = next_cut is not None and elapsed + frame_seconds / 2 >= next_cut
+                if buffer and (at_cut or len(buffer) + len(frame) > self.MAX_SEGMENT_SIZE):
+                    yield self._buffer_segment(buffer), start + segment_start, start + elapsed
+                    buffer = bytearray()
+                    segment_start = elapsed
+                    if at_cut:
+                        next_cut = next(boundaries, None)
+                buffer += frame
+                elapsed += frame_seconds
+            if buffer:
+                yield self._buffer_segment(buffer), start + segment_start, start + elapsed
+            
+            stderr = process.stderr.read()
+            if process.wait() != 0:
+                logging.error(f"FFmpeg error: {stderr.decode()}")
+                raise ffmpeg.Error('ffmpeg', None, stderr)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    def _buffer_segment(self, data):
+        if len(data) <= self.SPILL_THRESHOLD:
+            return AudioSegment(data=bytes(data))
+        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as spill_file:
+            spill_file.write(data)
+        return AudioSegment(path=spill_file.name)
+
+    def split_audio_per_chunk(self, file_path, duration, chunk_duration, start=0):
+        """Split audio by running a separate seek + encode ffmpeg process for every chunk"""
+        current_time = start
+        while current_time < duration:
+            length = min(chunk_duration, duration - current_time)
+            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
+                try:
+                    stream = ffmpeg.input(file_path, ss=current_time, t=length)
+                    stream = ffmpeg.output(stream, temp_file.name, 
+                        loglevel='error',
+                        **self.encode_args
+                    )
+                    ffmpeg.run(stream, overwrite_output=True)
+                    
+                    if os.path.getsize(temp_file.name) >= self.MAX_SEGMENT_SIZE:
+                        os.unlink(temp_file.name)
+                        for subchunk in range(2):
+                            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as sub_file:
+                                sub_start = current_time + (subchunk * (length/2))
+                                substream = ffmpeg.input(file_path, 
+                                    ss=sub_start, 
+                                    t=length/2
+                                )
+                                substream = ffmpeg.output(substream, sub_file.name,
+                                    loglevel='error',
+                                    **self.encode_args
+                                )
+                                ffmpeg.run(substream, overwrite_output=True)
+                                yield AudioSegment(path=sub_file.name), sub_start, sub_start + length/2
+                    else:
+                        yield AudioSegment(path=temp_file.name), current_time, current_time + length
+                
+                except ffmpeg.Error as e:
+                    logging.error(f"FFmpeg error: {e.stderr.decode()}")
+                    raise
+            
+            current_time += chunk_duration
+
+    def get_audio_duration(self, file_path):
+        """Get audio file duration and determine chunk size"""
+        analysis = self.analyze_audio(file_path)
+        return analysis.duration, analysis.estimated_segments, analysis.chunk_duration
@@ -1,13 +1,41 @@
 import os
+import re
+import sys
+import math
+import time
+import inspect
 import logging
-from flask import Flask, request, jsonify, send_from_directory, redirect, url_for, render_template
+import functools
+from flask import Flask, request, jsonify, send_from_directory, redirect, url_for, render_template, Response, stream_with_context
+import json
 from werkzeug.utils import secure_filename
-from openai import OpenAI
 import tempfile
-from threading import Lock
+from threading import Lock, BoundedSemaphore
+from concurrent.futures import ThreadPoolExecutor
 import ffmpeg
 from audio_processor import AudioProcessor
+from progress_store import create_progress_store
+from transcription_cache import TranscriptionCache, hash_file
+from upload_spool import UploadSpool, UploadError
+from job_scheduler import JobScheduler, JobCancelled, JobExistsError, QueueFullError
+from post_store import PostStore
+from job_checkpoints import CheckpointStore
+import transcript_patch
+from topic_speculation import TopicSpeculator, normalize_transcript
+from llm_cache import LLMResponseCache
+from upstream import UpstreamClient, UserConcurrencyLimit, create_openai_client
+from fake_openai import FakeOpenAI
+from transcribers import create_transcriber, available_cores
+from static_export import StaticExporter
+import uuid
 import prompts
+import tracing
+
+if __name__ == '__main__':
+    # Spawned worker processes (the local Whisper pool) re-run the main script before anything
+    # else. Serve through `python -m flask`, whose __main__ they skip, so they don't each build the app.
+    os.execv(sys.executable, [sys.executable, '-m', 'flask', '--app', os.path.abspath(__file__), 'run', '--debug'])
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -20,22 +48,170 @@ app = Flask(__name__,
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'mp3', 'wav', 'ogg', 'm4a'}
 MAX_SEGMENT_SIZE = 24 * 1024 * 1024  # 24MB to be safe
-OPTIMAL_DURATION = 180  # Start with 3 minutes (usually ~4-5MB at 192kbps)
+OPTIMAL_DURATION = 180  # Start with 3 minutes (~1.5MB at 64kbps mono, ~4-5MB at 192kbps)
 FALLBACK_DURATION = 90  # Fallback to 90 seconds if audio is dense
+SILENCE_AWARE_CHUNKS = os.environ.get('SILENCE_AWARE_CHUNKS', '1') == '1'  # Cut chunks in pauses, skip long silences
+TRIM_SILENCE_SECONDS = float(os.environ.get('TRIM_SILENCE_SECONDS', 5))
+SEGMENT_BITRATE = int(os.environ.get('SEGMENT_BITRATE', 64000))  # Mono 64kbps is plenty for speech recognition
+SEGMENT_CHANNELS = int(os.environ.get('SEGMENT_CHANNELS', 1))
+TRANSCRIBE_BACKEND = os.environ.get('TRANSCRIBE_BACKEND', 'openai')  # 'local' runs faster-whisper on this machine's CPUs
+LOCAL_WHISPER_MODEL = os.environ.get('LOCAL_WHISPER_MODEL', 'base')
+LOCAL_WHISPER_COMPUTE_TYPE = os.environ.get('LOCAL_WHISPER_COMPUTE_TYPE', 'int8')
+LOCAL_WHISPER_THREADS = int(os.environ.get('LOCAL_WHISPER_THREADS', 2))  # CPU threads per worker process
+LOCAL_WHISPER_WORKERS = int(os.environ.get('LOCAL_WHISPER_WORKERS', 0)) or max(1, available_cores() // LOCAL_WHISPER_THREADS)
+# Segments transcribed in parallel (1 = serial); the local backend needs one per worker process to keep it busy
+TRANSCRIBE_WORKERS = int(os.environ.get('TRANSCRIBE_WORKERS', 4 if TRANSCRIBE_BACKEND == 'openai' else LOCAL_WHISPER_WORKERS))
+MAX_PENDING_SEGMENTS = int(os.environ.get('MAX_PENDING_SEGMENTS', TRANSCRIBE_WORKERS * 2))  # Encoded segments buffered at once
+SEGMENT_BUFFERS = os.environ.get('SEGMENT_BUFFERS', 'memory')  # 'disk' writes every segment to a temp file
+SEGMENT_SPILL_BYTES = int(os.environ.get('SEGMENT_SPILL_BYTES', 8 * 1024 * 1024))  # Larger in-memory segments spill to disk
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 2 * 1024 * 1024 * 1024))  # 2GB, enforced while streaming
+UPLOAD_TTL = int(os.environ.get('UPLOAD_TTL', 24 * 3600))  # Seconds an unfinished chunked upload is kept without new chunks
+PROGRESS_STORE = os.environ.get('PROGRESS_STORE', 'memory')  # 'sqlite' to share progress across worker processes
+PROGRESS_DB_PATH = os.environ.get('PROGRESS_DB_PATH', 'cache/progress.db')
+PROGRESS_TTL = int(os.environ.get('PROGRESS_TTL', 3600))  # Seconds finished sessions stay visible
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # Uploads processed at once; the rest wait in the queue
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 100))
+TOPIC_MAP_REDUCE_CHARS = int(os.environ.get('TOPIC_MAP_REDUCE_CHARS', 40000))  # Longer transcripts are chunked for topic extraction
+TOPIC_CHUNK_CHARS = int(os.environ.get('TOPIC_CHUNK_CHARS', 12000))
+TOPIC_MAP_WORKERS = int(os.environ.get('TOPIC_MAP_WORKERS', 4))
+CARD_BATCH_USER_CONCURRENCY = int(os.environ.get('CARD_BATCH_USER_CONCURRENCY', 4))  # Model calls in flight per user for batched card operations
+CARD_BATCH_WORKERS = int(os.environ.get('CARD_BATCH_WORKERS', 16))
+CARD_BATCH_MAX_OPERATIONS = int(os.environ.get('CARD_BATCH_MAX_OPERATIONS', 100))
+SPECULATIVE_TOPIC_CARDS = os.environ.get('SPECULATIVE_TOPIC_CARDS', '0') == '1'  # Precompute cards once a transcript is ready; costs a gpt-4o call per upload
+SPECULATIVE_GRANULARITIES = [int(g) for g in os.environ.get('SPECULATIVE_GRANULARITIES', '3').split(',')]
+OPENAI_BACKEND = os.environ.get('OPENAI_BACKEND', 'openai')  # 'fake' runs the whole pipeline offline
+OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 120))
+OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 5))
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 32))
+OPENAI_REQUESTS_PER_SECOND = float(os.environ.get('OPENAI_REQUESTS_PER_SECOND', 0))  # 0 = no client-side limit
+OPENAI_ASYNC_MAX_CONNECTIONS = int(os.environ.get('OPENAI_ASYNC_MAX_CONNECTIONS', 256))  # Model calls in flight on the ASGI event loop
+FAKE_OPENAI_LATENCY = float(os.environ.get('FAKE_OPENAI_LATENCY', 0.5))
+LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', 'cache/llm_responses.db')
+LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+POST_DB_PATH = os.environ.get('POST_DB_PATH', 'data/posts.db')
+POST_CACHE_SIZE = int(os.environ.get('POST_CACHE_SIZE', 256))  # Hot posts kept in memory
+CHECKPOINT_DB_PATH = os.environ.get('CHECKPOINT_DB_PATH', 'data/checkpoints.db')
+EXPORT_STATE_PATH = os.environ.get('EXPORT_STATE_PATH', 'data/exports.db')  # What each export target last received
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 4))  # Posts rendered at once
+EXPORT_DRIVE_FOLDER = os.environ.get('EXPORT_DRIVE_FOLDER', 'exports/drive')  # Point at a folder synced by Google Drive for desktop
+TRANSCRIPTION_CACHE_PATH = os.environ.get('TRANSCRIPTION_CACHE_PATH', 'cache/transcriptions.db')
+TRANSCRIPTION_CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_BYTES', 256 * 1024 * 1024))
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE
+
+# Initialize OpenAI client; every upstream call goes through the retrying, rate-limited wrapper
+client = UpstreamClient(
+    FakeOpenAI(latency=FAKE_OPENAI_LATENCY, bitrate=SEGMENT_BITRATE) if OPENAI_BACKEND == 'fake'
+    else create_openai_client(timeout=OPENAI_TIMEOUT, max_connections=OPENAI_MAX_CONNECTIONS),
+    max_retries=OPENAI_MAX_RETRIES,
+    requests_per_second=OPENAI_REQUESTS_PER_SECOND or None
+)
 
-# Initialize OpenAI client
-client = OpenAI()
+# Deterministic (temperature=0) chat completions are memoized and in-flight duplicates coalesced
+llm_cache = LLMResponseCache(LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES)
+
+def chat_completion(**params):
+    """Text of a chat completion; every non-streaming call site goes through here"""
+    with tracing.span('chat_completion'):
+        return llm_cache.complete(client, **params)
+
+# Model calls for batched card operations, capped per user so one editor can't starve the rest
+card_executor = ThreadPoolExecutor(max_workers=CARD_BATCH_WORKERS, thread_name_prefix='card-op')
+card_user_limit = UserConcurrencyLimit(CARD_BATCH_USER_CONCURRENCY)
+
+# Speech to text: hosted Whisper through the upstream client, or a local model on a process pool
+if TRANSCRIBE_BACKEND == 'local':
+    transcriber = create_transcriber('local', model_size=LOCAL_WHISPER_MODEL, compute_type=LOCAL_WHISPER_COMPUTE_TYPE,
+                                     cpu_threads=LOCAL_WHISPER_THREADS, workers=LOCAL_WHISPER_WORKERS)
+else:
+    transcriber = create_transcriber('openai', client)
 
 # Progress tracking
-audio_processor = AudioProcessor()
+audio_processor = AudioProcessor(
+    max_segment_size=MAX_SEGMENT_SIZE,
+    optimal_duration=OPTIMAL_DURATION,
+    fallback_duration=FALLBACK_DURATION,
+    encode_bitrate=SEGMENT_BITRATE,
+    encode_channels=SEGMENT_CHANNELS,
+    silence_aware=SILENCE_AWARE_CHUNKS,
+    trim_silence=TRIM_SILENCE_SECONDS,
+    in_memory=SEGMENT_BUFFERS == 'memory',
+    spill_threshold=SEGMENT_SPILL_BYTES,
+    progress_store=create_progress_store(PROGRESS_STORE, db_path=PROGRESS_DB_PATH, finished_ttl=PROGRESS_TTL)
+)
+
+# Blog posts and topic cards
+post_store = PostStore(POST_DB_PATH, cache_size=POST_CACHE_SIZE)
+
+# Topic cards generated while the user is still reviewing the transcript
+topic_speculator = TopicSpeculator(
+    lambda transcript, granularity: generate_topic_cards(transcript, granularity),
+    post_store, granularities=SPECULATIVE_GRANULARITIES
+) if SPECULATIVE_TOPIC_CARDS else None
+
+# Per-segment results of in-progress and failed transcriptions
+checkpoints = CheckpointStore(CHECKPOINT_DB_PATH)
+
+# Background transcription jobs
+job_scheduler = JobScheduler(workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE)
+
+# Resumable chunked uploads
+upload_spool = UploadSpool(UPLOAD_FOLDER, MAX_UPLOAD_SIZE, ttl=UPLOAD_TTL)
+
+# Whisper results for previously seen uploads and segments
+transcription_cache = TranscriptionCache(TRANSCRIPTION_CACHE_PATH, max_bytes=TRANSCRIPTION_CACHE_MAX_BYTES)
+
+# Static HTML export; folder exports run one at a time in the background
+exporter = StaticExporter(post_store, os.path.join(app.root_path, app.template_folder), EXPORT_STATE_PATH, workers=EXPORT_WORKERS)
+export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export-folder')
+drive_export = None
+drive_export_lock = Lock()
 
 def setup_upload_folder():
     """Create the uploads directory if it doesn't exist."""
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     logging.info(f"Upload folder '{UPLOAD_FOLDER}' is set up.")
 
+setup_upload_folder()
+
+class RequestError(Exception):
+    """A request that can't be served; ``json_errors`` turns it into a JSON error with ``status``"""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.body = {'error': message, **details}
+
+def json_errors(view):
+    """Answer RequestError with its JSON error and anything else with a logged 500.
+
+    Works on both plain and async views, so the Flask routes and their async
+    copies in asgi.py share the same request checks and error responses.
+    """
+    def handle(e):
+        if isinstance(e, RequestError):
+            return e.body, e.status
+        logging.exception(f"Error in {view.__name__}: {str(e)}")
+        return {'error': str(e)}, 500
+
+    if inspect.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await view(*args, **kwargs)
+            except Exception as e:
+                return handle(e)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            return view(*args, **kwargs)
+        except Exception as e:
+            return handle(e)
+    return wrapper
+
 @app.route('/')
 def serve_index():
     logging.info("Serving index.html")
@@ -46,71 +222,195 @@ def allowed_file(filename):
     logging.debug(f"File '{filename}' allowed: {is_allowed}")
     return is_allowed
 
-def transcribe_segment(file_path):
-    """Transcribe a single audio segment"""
+def transcribe_segment(segment):
+    """Transcribe a single audio segment into Whisper's (start, end, text) segments, timed from its start"""
     try:
-        with open(file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                file=audio_file,
-                model="whisper-1",
-                response_format="verbose_json",
-                timestamp_granularities=["segment"]
-            )
-        logging.info(f"Transcribed segment: {file_path}")
-        return transcript.text
+        with tracing.span('transcribe'):
+            segments = transcriber.transcribe(segment)
+        logging.info(f"Transcribed segment: {segment}")
+        return segments
         
     except Exception as e:
         logging.error(f"Error in transcribe_segment: {str(e)}")
         raise
 
-def process_audio_file(file_path, session_id):
-    """Process audio file with progress tracking"""
+def transcription_cache_key(content_hash):
+    """Cache key for an upload's or segment's hash; results from different models are kept apart"""
+    return content_hash if TRANSCRIBE_BACKEND == 'openai' else f"{transcriber.name}:{content_hash}"
+
+def transcribe_segment_cached(segment):
+    """Transcribe a segment unless an identical encoded segment was seen before.
+
+    Returns (segments, cache_hit).
+    """
+    segment_hash = transcription_cache_key(segment.sha256())
+    cached = transcription_cache.get_segment(segment_hash)
+    if cached is not None:
+        logging.info(f"Transcription cache hit for segment: {segment}")
+        return cached, True
+    
+    segments = transcribe_segment(segment)
+    transcription_cache.put_segment(segment_hash, segments)
+    return segments, False
+
+def report_segment_progress(session_id, done, estimated_segments, cache_hits):
+    progress_msg = f"Transcribing audio... ({done} of {estimated_segments} parts complete)"
+    if done == estimated_segments:
+        progress_msg = "Finalizing transcription..."
+    audio_processor.update_progress(session_id, done, estimated_segments, status=progress_msg, cache_hits=cache_hits)
+
+def transcribe_segments_pipelined(segments, handle_segment, session_id,
+                                  workers=TRANSCRIBE_WORKERS, max_pending=MAX_PENDING_SEGMENTS):
+    """Transcribe segments on a worker pool while ffmpeg keeps encoding ahead.
+
+    ``handle_segment(segment, start, end)`` runs on a worker for each
+    (segment, start, end) from ``segments``. At most ``max_pending`` encoded
+    segments are buffered at once; the encoder blocks until a worker has
+    finished (and released) one.
+    """
+    slots = BoundedSemaphore(max(1, max_pending))
+
+    def work(segment, start, end):
+        try:
+            handle_segment(segment, start, end)
+        finally:
+            segment.release()
+            slots.release()
+
+    submitted = []
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='transcribe')
+    try:
+        while True:
+            job_scheduler.check_cancelled(session_id)
+            
+            # Reserve a slot before ffmpeg encodes the next segment
+            with tracing.span('backpressure_wait', session_id):
+                slots.acquire()
+            try:
+                with tracing.span('encode', session_id):
+                    segment, start, end = next(segments)
+            except StopIteration:
+                slots.release()
+                break
+            except Exception:
+                slots.release()
+                raise
+
+            future = executor.submit(work, segment, start, end)
+            submitted.append((future, segment))
+
+            # Fail fast instead of encoding the rest of the file
+            for done_future, _ in submitted:
+                if done_future.done() and done_future.exception():
+                    raise done_future.exception()
+
+        for future, _ in submitted:
+            future.result()
+
+    except Exception:
+        for future, segment in submitted:
+            if future.cancel():
+                segment.release()
+        segments.close()
+        raise
+
+    finally:
+        executor.shutdown(wait=True)
+
+def process_audio_file(file_path, session_id, workers=TRANSCRIBE_WORKERS, filename=None):
+    """Process audio file with progress tracking and return its SegmentTimeline.
+
+    Each finished segment is checkpointed with its time offsets, so if the job
+    fails, running it again only transcribes the time ranges still missing.
+    """
     try:
         audio_processor.update_progress(session_id, 0, 1, status="Analyzing audio file...")
         
-        # Get duration and segment information
-        duration, estimated_segments, _ = audio_processor.get_audio_duration(file_path)
-        minutes = int(duration / 60)
+        # Identical re-uploads skip splitting and Whisper entirely
+        with tracing.span('hash', session_id):
+            file_hash = hash_file(file_path)
+        cached = transcription_cache.get_file(transcription_cache_key(file_hash))
+        if cached is not None:
+            logging.info(f"Transcription cache hit for upload: {file_path}")
+            audio_processor.update_progress(session_id, len(cached), len(cached),
+                           status="Finalizing transcription...", cache_hits=len(cached))
+            return cached
+        
+        checkpoints.start_job(session_id, file_hash, file_path, filename or os.path.basename(file_path))
         
-        audio_processor.update_progress(session_id, 0, estimated_segments, 
+        # Probe once; the splitter reuses this instead of probing again
+        analysis = audio_processor.analyze_audio(file_path)
+        minutes = int(analysis.duration / 60)
+        
+        # Only the parts of the file without a checkpointed transcription need splitting
+        finished = checkpoints.segments(file_hash)
+        missing = checkpoints.missing_ranges(file_hash, analysis.duration)
+        estimated_segments = len(finished) + sum(max(1, math.ceil((end - start) / analysis.chunk_duration))
+                                                 for start, end in missing)
+        # A resumed job keeps its session ID, so drop what the failed run published before republishing
+        audio_processor.clear_segments(session_id)
+        for start, end, text in finished:
+            audio_processor.publish_segment(session_id, start, end, text)
+        if finished:
+            logging.info(f"Resuming {file_path}: {len(finished)} segments checkpointed, {len(missing)} ranges missing")
+        
+        audio_processor.update_progress(session_id, len(finished), estimated_segments, 
                        status=f"Starting transcription... (about {minutes} minute{'s' if minutes != 1 else ''} of audio)")
         
-        segments_processed = 0
-        transcriptions = []
-        current_segment = None
+        progress_lock = Lock()
+        completed = [len(finished)]
+        cache_hits = [0]
         
-        for segment_path in audio_processor.split_audio_streaming(file_path):
-            try:
-                if current_segment and os.path.exists(current_segment):
-                    os.unlink(current_segment)
-                
-                current_segment = segment_path
-                transcription = transcribe_segment(segment_path)
-                transcriptions.append(transcription)
-                segments_processed += 1
-                
-                progress_msg = f"Transcribing audio... ({segments_processed} of {estimated_segments} parts complete)"
-                if segments_processed == estimated_segments:
-                    progress_msg = "Finalizing transcription..."
-                
-                audio_processor.update_progress(session_id, segments_processed, estimated_segments, status=progress_msg)
+        def handle_segment(segment, start, end):
+            with tracing.bind(session_id):
+                whisper_segments, cache_hit = transcribe_segment_cached(segment)
+                timed = [(start + s, start + e, text.strip()) for s, e, text in whisper_segments]
+                transcription = ' '.join(text for _, _, text in timed)
+                with tracing.span('checkpoint'):
+                    checkpoints.save_segment(file_hash, start, end, transcription, timed)
+            audio_processor.publish_segment(session_id, start, end, transcription)
+            
+            # Publish under the lock so concurrent workers can't report counts out of order
+            with progress_lock:
+                completed[0] += 1
+                cache_hits[0] += cache_hit
+                report_segment_progress(session_id, completed[0], estimated_segments, cache_hits[0])
+        
+        segments = audio_processor.split_audio_streaming(file_path, analysis, ranges=missing,
+                                                         on_skip=lambda start, end: checkpoints.save_skipped(file_hash, start, end))
+        if workers > 1:
+            transcribe_segments_pipelined(segments, handle_segment, session_id, workers=workers)
+        else:
+            while True:
+                with tracing.span('encode', session_id):
+                    segment, start, end = next(segments, (None, None, None))
+                if segment is None:
+                    break
+                try:
+                    job_scheduler.check_cancelled(session_id)
+                    handle_segment(segment, start, end)
+                    
+                except Exception as e:
+                    logging.error(f"Error processing segment: {str(e)}")
+                    raise
                 
-            except Exception as e:
-                logging.error(f"Error processing segment: {str(e)}")
-                raise
+                finally:
+                    segment.release()
         
-        if current_segment and os.path.exists(current_segment):
-            os.unlink(current_segment)
-            
-        return ' '.join(transcriptions)
+        timeline = checkpoints.timeline(file_hash)
+        transcription_cache.put_file(transcription_cache_key(file_hash), timeline)
+        checkpoints.set_status(session_id, 'complete')
+        # The cached file transcription supersedes the per-segment checkpoints
+        checkpoints.clear(session_id)
+        return timeline
             
+    except JobCancelled:
+        raise
+        
     except Exception as e:
         logging.error(f"Error in process_audio_file: {str(e)}")
-        with audio_processor.progress_lock:
-            audio_processor.progress_data[session_id].update({
-                'status': 'Error: Failed to process audio file',
-                'error': str(e)
-            })
+        audio_processor.set_progress_fields(session_id, status='Error: Failed to process audio file', error=str(e),
+                                            resumable=checkpoints.get_job(session_id) is not None)
         raise
 
 @app.route('/check-progress/<session_id>')
@@ -119,8 +419,198 @@ def check_progress(session_id):
     progress = audio_processor.get_progress(session_id)
     if not progress:
         return jsonify({'error': 'Session not found'}), 404
+    
+    queue_position = job_scheduler.queue_position(session_id)
+    if queue_position is not None:
+        progress = {**progress, 'queue_position': queue_position,
+                    'status': f"Waiting in queue... ({queue_position - 1} ahead of you)" if queue_position > 1 else "Starting soon..."}
     return jsonify(progress)
 
+@app.route('/progress-stream/<session_id>')
+def progress_stream(session_id):
+    """Server-Sent Events: a 'progress' event whenever progress changes and a
+    'segment' event with each finished segment's transcript"""
+    if not audio_processor.get_progress(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    
+    def events():
+        version, segments_seen = -1, 0
+        while True:
+            new_version, progress, segments = audio_processor.wait_for_progress(session_id, version, segments_seen)
+            if progress is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Session not found'})}\n\n"
+                return
+            
+            if new_version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            
+            for segment in segments:
+                yield f"event: segment\ndata: {json.dumps(segment)}\n\n"
+            segments_seen += len(segments)
+            
+            queue_position = job_scheduler.queue_position(session_id)
+            if queue_position is not None:
+                progress['queue_position'] = queue_position
+            yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+            
+            if progress.get('status') in ('complete', 'error', 'cancelled'):
+                return
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/resume/<session_id>', methods=['POST'])
+def resume_job(session_id):
+    """Re-run a failed transcription; only segments without a checkpoint are transcribed again"""
+    try:
+        job = checkpoints.get_job(session_id)
+        if job is None:
+            return jsonify({'error': 'No transcription found for this session'}), 404
+        if job['status'] == 'complete':
+            return jsonify({'error': 'Transcription already complete'}), 409
+        if job_scheduler.is_active(session_id):
+            return jsonify({'error': 'Transcription is already running'}), 409
+        if not os.path.exists(job['file_path']):
+            return jsonify({'error': 'The uploaded file is no longer available; please upload it again'}), 410
+        
+        start_transcription(job['file_path'], job['filename'], session_id)
+        return jsonify({'success': True, 'message': 'Processing resumed', 'session_id': session_id})
+    
+    except JobExistsError as e:
+        return jsonify({'error': str(e)}), 409
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+
+@app.route('/check-progress/<session_id>/timings')
+def check_progress_timings(session_id):
+    """Seconds spent in each pipeline stage (count, total and longest occurrence) for a job"""
+    timings = tracing.tracer.breakdown(session_id)
+    if timings is None:
+        timings = (audio_processor.get_progress(session_id) or {}).get('timings')
+    if timings is None:
+        return jsonify({'error': 'No timings for this session'}), 404
+    return jsonify({'session_id': session_id, 'stages': timings})
+
+@app.route('/cancel/<session_id>', methods=['POST'])
+def cancel_job(session_id):
+    """Cancel a queued or running transcription"""
+    if not job_scheduler.cancel(session_id):
+        return jsonify({'error': 'No active job for this session'}), 404
+    
+    audio_processor.set_progress_fields(session_id, status='cancelled')
+    return jsonify({'success': True})
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Entry counts, sizes and hit/miss counters for the transcription and LLM response caches"""
+    return jsonify({
+        'transcriptions': transcription_cache.stats(),
+        'llm_responses': llm_cache.stats()
+    })
+
+@app.route('/upstream/stats')
+def upstream_stats():
+    """Per-operation call outcomes and latency histograms for OpenAI calls"""
+    return jsonify(client.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of pipeline stage timings, upstream calls, jobs and caches"""
+    upstream = client.stats()
+    jobs = job_scheduler.metrics()
+    caches = {'transcriptions': transcription_cache.stats(), 'llm_responses': llm_cache.stats()}
+    
+    lines = tracing.prometheus_histograms(
+        'pipeline_stage_seconds', 'Time spent in each transcription and generation stage', 'stage', tracing.tracer.snapshots())
+    lines += tracing.prometheus_histograms(
+        'upstream_request_seconds', 'Latency of successful OpenAI calls', 'operation', upstream['latency_seconds'])
+    lines += tracing.prometheus_samples(
+        'upstream_requests_total', 'OpenAI call attempts by outcome', 'counter',
+        [(dict(zip(('operation', 'outcome'), key.rsplit('_', 1))), count)
+         for key, count in sorted(upstream['counters'].items())])
+    lines += tracing.prometheus_samples('jobs_running', 'Transcription jobs running', 'gauge', [({}, jobs['running'])])
+    lines += tracing.prometheus_samples('jobs_queued', 'Transcription jobs waiting', 'gauge', [({}, jobs['queue_depth'])])
+    lines += tracing.prometheus_samples(
+        'jobs_total', 'Transcription jobs by outcome', 'counter',
+        [({'outcome': outcome}, jobs[outcome]) for outcome in ('submitted', 'completed', 'failed', 'cancelled', 'rejected')])
+    for name, metric_type, field in (('cache_hits_total', 'counter', 'hits'), ('cache_misses_total', 'counter', 'misses'),
+                                     ('cache_bytes', 'gauge', 'bytes')):
+        lines += tracing.prometheus_samples(name, f"Cache {field}", metric_type,
+                                            [({'cache': cache}, stats[field]) for cache, stats in caches.items()])
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs/metrics')
+def job_metrics():
+    """Queue depth, job wait times and outcome counters for the transcription scheduler"""
+    return jsonify(job_scheduler.metrics())
+
+def remove_upload(file_path):
+    try:
+        os.unlink(file_path)
+    except FileNotFoundError:
+        pass
+
+def release_upload(session_id, file_path):
+    """Delete a finished job's upload unless the job can still be resumed from it.
+
+    Failed and cancelled jobs keep their file for /resume; checkpoints.prune()
+    deletes it when it forgets the job.
+    """
+    job = checkpoints.get_job(session_id)
+    if job is None or job['status'] == 'complete' or job['file_path'] != file_path:
+        remove_upload(file_path)
+
+def start_transcription(file_path, filename, session_id):
+    """Transcribe an uploaded file in the background and publish the result as a blog post"""
+    def process_async():
+        try:
+            with tracing.span('job_total'):
+                timeline = process_audio_file(file_path, session_id, filename=filename)
+                transcription = timeline.text
+                
+                # Create blog post and update response
+                with tracing.span('post_create'):
+                    post_id = post_store.create_post(
+                        title=f"Transcript: {filename}",
+                        keyword='audio_transcript',
+                        content=transcription,
+                        timeline=timeline
+                    )
+            
+            # Update progress data with success; the timing breakdown is kept with it so
+            # other worker processes can serve it too
+            audio_processor.set_progress_fields(session_id, status='complete', success=True, id=post_id,
+                                                timings=tracing.tracer.breakdown(session_id))
+            
+            if topic_speculator:
+                topic_speculator.schedule(transcription)
+        
+        except JobCancelled:
+            logging.info(f"Transcription cancelled: {session_id}")
+            audio_processor.set_progress_fields(session_id, status='cancelled')
+                
+        except Exception as e:
+            logging.error(f"Error processing file: {str(e)}")
+            audio_processor.set_progress_fields(session_id, status='error', error=str(e))
+            raise
+        
+        finally:
+            # Checkpoints of jobs nobody resumed would otherwise accumulate forever
+            checkpoints.prune()
+            release_upload(session_id, file_path)
+    
+    # Checked before touching progress so a running job's status isn't overwritten; submit re-checks
+    if job_scheduler.is_active(session_id):
+        raise JobExistsError(f"A transcription is already running for session {session_id}")
+    audio_processor.update_progress(session_id, 0, 1, status="Waiting in queue...")
+    try:
+        job_scheduler.submit(session_id, process_async)
+    except QueueFullError as e:
+        audio_processor.update_progress(session_id, 0, 1, status='error', error=str(e))
+        raise
+
 @app.route('/upload-audio', methods=['POST'])
 def upload_audio():
     try:
@@ -139,53 +629,26 @@ def upload_audio():
             logging.error(f"Invalid file type: {file.filename}")
             return jsonify({'error': 'Invalid file type. Allowed types: ' + ', '.join(ALLOWED_EXTENSIONS)}), 400
         
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        # Save file
-        file.save(file_path)
-        
         session_id = request.form.get('session_id')
         if not session_id:
             return jsonify({'error': 'No session ID provided'}), 400
-            
-        # Start processing in background
-        def process_async():
-            try:
-                transcription = process_audio_file(file_path, session_id)
-                
-                # Create blog post and update response
-                blog_post = {
-                    'title': f"Transcript: {filename}",
-                    'keyword': 'audio_transcript',
-                    'content': transcription
-                }
-                
-                if not hasattr(app, 'blog_posts'):
-                    app.blog_posts = []
-                
-                app.blog_posts.append(blog_post)
-                post_id = len(app.blog_posts) - 1
-                
-                # Update progress data with success
-                with audio_processor.progress_lock:
-                    audio_processor.progress_data[session_id].update({
-                        'status': 'complete',
-                        'success': True,
-                        'id': post_id
-                    })
-                    
-            except Exception as e:
-                logging.error(f"Error processing file: {str(e)}")
-                with audio_processor.progress_lock:
-                    audio_processor.progress_data[session_id].update({
-                        'status': 'error',
-                        'error': str(e)
-                    })
+        if job_scheduler.is_active(session_id):
+            return jsonify({'error': 'A transcription is already running for this session'}), 409
+        
+        # Prefix with a unique ID so uploads with the same name don't overwrite each other
+        filename = secure_filename(file.filename)
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
         
-        # Start processing in background
-        from threading import Thread
-        Thread(target=process_async).start()
+        # Save file
+        with tracing.span('upload_save', session_id):
+            file.save(file_path)
+            
+        # Start processing in background; a job that never started leaves nobody to delete the file
+        try:
+            start_transcription(file_path, filename, session_id)
+        except (JobExistsError, QueueFullError):
+            remove_upload(file_path)
+            raise
         
         # Return immediate response
         return jsonify({
@@ -193,206 +656,428 @@ def upload_audio():
             'message': 'Processing started',
             'session_id': session_id
         })
+    
+    except JobExistsError as e:
+        return jsonify({'error': str(e)}), 409
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
         
     except Exception as e:
         logging.error(f"Unexpected error in upload_audio: {str(e)}")
         logging.exception("Full traceback:")
         return jsonify({'error': 'An unexpected error occurred. Please check the logs.'}), 500
 
+@app.route('/upload-audio/start', methods=['POST'])
+def start_chunked_upload():
+    """Begin a resumable upload; the client then PUTs the file in chunks"""
+    try:
+        data = request.json
+        filename = data.get('filename', '')
+        session_id = data.get('session_id')
+        
+        if not allowed_file(filename):
+            logging.error(f"Invalid file type: {filename}")
+            return jsonify({'error': 'Invalid file type. Allowed types: ' + ', '.join(ALLOWED_EXTENSIONS)}), 400
+        
+        if not session_id:
+            return jsonify({'error': 'No session ID provided'}), 400
+        
+        upload_id = upload_spool.create(secure_filename(filename), int(data.get('size', 0)), session_id)
+        return jsonify({'success': True, 'upload_id': upload_id, 'offset': 0})
+        
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logging.error(f"Error in start_chunked_upload: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/upload-audio/<upload_id>', methods=['PUT'])
+def upload_audio_chunk(upload_id):
+    """Stream one chunk of the request body into the spool file at ?offset="""
+    try:
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({'error': 'No offset provided'}), 400
+        
+        upload = upload_spool.append(upload_id, offset, request.stream)
+        if upload is None:
+            return jsonify({'success': True, 'complete': False, 'offset': upload_spool.get(upload_id)['offset']})
+        
+        # The spool has let go of the file, so a job that never started leaves nobody to delete it
+        try:
+            start_transcription(upload['file_path'], upload['filename'], upload['session_id'])
+        except (JobExistsError, QueueFullError):
+            remove_upload(upload['file_path'])
+            raise
+        return jsonify({
+            'success': True,
+            'complete': True,
+            'message': 'Processing started',
+            'session_id': upload['session_id']
+        })
+        
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except JobExistsError as e:
+        return jsonify({'error': str(e)}), 409
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logging.error(f"Error in upload_audio_chunk: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/upload-audio/<upload_id>', methods=['GET'])
+def upload_audio_status(upload_id):
+    """Bytes received so far, for resuming an interrupted upload"""
+    try:
+        upload = upload_spool.get(upload_id)
+        return jsonify({'offset': upload['offset'], 'size': upload['size']})
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
 @app.route('/blog')
 def view_blog():
     post_id = request.args.get('id', type=int)
-    if not hasattr(app, 'blog_posts') or post_id is None or post_id >= len(app.blog_posts):
+    post = post_store.get_post(post_id) if post_id is not None else None
+    if post is None:
         return "Blog post not found", 404
     
     try:
         return render_template('transcripteditor.html', 
-                             blog_posts=[app.blog_posts[post_id]])
+                             blog_posts=[post])
     except Exception as e:
         logging.error(f"Error rendering blog template: {str(e)}")
         return f"Error rendering blog template: {str(e)}", 500
 
+TRANSCRIPT_EDITOR_MODEL = "gpt-4o-mini-2024-07-18"  # or "gpt-3.5-turbo" depending on your needs
+TRANSCRIPT_EDITOR_PROMPT = "You are a helpful transcript editor. Your task is to help users fix any inaccuracies in transcripts while preserving the original meaning and style. Focus on correcting errors in transcription, grammar, and punctuation while maintaining the speaker's voice and intent."
+
+def transcript_editor_messages(blog_content, message):
+    return [
+        {"role": "system", "content": TRANSCRIPT_EDITOR_PROMPT},
+        {"role": "user", "content": f"Here's the current blog content:\n\n{blog_content}\n\nUser request: {message}"}
+    ]
+
+def require_post(post_id):
+    post = post_store.get_post(post_id)
+    if post is None:
+        raise RequestError('Blog post not found', 404)
+    return post
+
+def chat_fields(data):
+    """(message, blogContent) of a /chat request"""
+    if not data.get('message'):
+        raise RequestError('No message provided')
+    return data['message'], data.get('blogContent')
+
 @app.route('/chat/<int:post_id>', methods=['POST'])
+@json_errors
 def chat_with_ai(post_id):
+    require_post(post_id)
+    message, blog_content = chat_fields(request.json)
+
+    # Create chat completion with OpenAI
+    ai_response = chat_completion(
+        model=TRANSCRIPT_EDITOR_MODEL,
+        messages=transcript_editor_messages(blog_content, message)
+    )
+
+    # Update the blog post content
+    post_store.update_content(post_id, ai_response)
+
+    return jsonify({'response': ai_response})
+
+@app.route('/chat/<int:post_id>/stream', methods=['POST'])
+@json_errors
+def chat_with_ai_stream(post_id):
+    """Like /chat, but forwards tokens as Server-Sent Events while the model writes.
+
+    Emits 'token' events, then a single 'done' event with the full response once the
+    edit has been saved (or an 'error' event). Nothing is saved if the stream is cut short.
+    """
+    require_post(post_id)
+    message, blog_content = chat_fields(request.json)
+
+    def events():
+        chunks = []
+        started = time.perf_counter()
+        try:
+            stream = client.chat.completions.create(
+                model=TRANSCRIPT_EDITOR_MODEL,
+                messages=transcript_editor_messages(blog_content, message),
+                stream=True
+            )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    if not chunks:
+                        tracing.record('chat_first_token', time.perf_counter() - started)
+                    chunks.append(delta)
+                    yield f"event: token\ndata: {json.dumps(delta)}\n\n"
+
+            # Only commit once the whole response has arrived
+            ai_response = ''.join(chunks)
+            post_store.update_content(post_id, ai_response)
+            yield f"event: done\ndata: {json.dumps({'response': ai_response})}\n\n"
+
+        except Exception as e:
+            logging.error(f"Error in chat stream: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/chat/<int:post_id>/edit', methods=['POST'])
+@json_errors
+def chat_edit_window(post_id):
+    """Edit only the passages relevant to the request and apply the model's patch.
+
+    Sends the user's selected text (or passages found by keyword search) plus
+    neighbours to the model, which returns find/replace edits. These are resolved
+    to character ranges, applied to the transcript and returned as 'patches'.
+    Answers 422 when no relevant passage is found, so the client can fall back to /chat.
+    """
+    post = require_post(post_id)
+    data = request.json
+    message, content = chat_fields(data)
+    content = content or post['content']
+
+    passages = transcript_patch.split_passages(content)
+    window = transcript_patch.select_window(content, passages, message, selected_text=data.get('selectedText'))
+    if not window:
+        raise RequestError('Could not find the part of the transcript this request refers to', 422)
+
+    logging.debug(f"Editing passages {window} of {len(passages)} for post {post_id}")
+    patch_response = chat_completion(
+        model=TRANSCRIPT_EDITOR_MODEL,
+        messages=[
+            {"role": "system", "content": transcript_patch.PATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": transcript_patch.window_prompt(content, passages, window, message)}
+        ],
+        response_format={"type": "json_object"},
+        temperature=0
+    )
+
     try:
-        if not hasattr(app, 'blog_posts') or post_id >= len(app.blog_posts):
-            return jsonify({'error': 'Blog post not found'}), 404
+        patches = transcript_patch.resolve_patch(content, passages, window, patch_response)
+    except transcript_patch.PatchError as e:
+        logging.error(f"Could not apply edit patch: {str(e)}")
+        raise RequestError(str(e), 502)
+    post_store.update_content(post_id, transcript_patch.apply_patch(content, patches))
 
-        data = request.json
-        message = data.get('message')
-        blog_content = data.get('blogContent')
+    # Keep the timestamped segments in step, and tell the editor which audio each edit covers.
+    # The editor's text differs from the timeline's in whitespace and markup, so compare and
+    # patch in normalized coordinates.
+    timeline = post_store.get_timeline(post_id)
+    if timeline is not None:
+        normalized, offsets = transcript_patch.normalize_with_offsets(content)
+        if timeline.text == normalized:
+            timeline_patches = transcript_patch.normalize_ranges(offsets, patches)
+            for patch, timeline_patch in zip(patches, timeline_patches):
+                patch['audio_start'], patch['audio_end'] = timeline.time_span(timeline_patch['start'], timeline_patch['end'])
+            post_store.set_timeline(post_id, timeline.apply_patch(timeline_patches))
 
-        if not message:
-            return jsonify({'error': 'No message provided'}), 400
+    return jsonify({'patches': patches, 'passages': window})
 
-        # Create chat completion with OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",  # or "gpt-3.5-turbo" depending on your needs
-            messages=[
-                {"role": "system", "content": "You are a helpful transcript editor. Your task is to help users fix any inaccuracies in transcripts while preserving the original meaning and style. Focus on correcting errors in transcription, grammar, and punctuation while maintaining the speaker's voice and intent."},
-                {"role": "user", "content": f"Here's the current blog content:\n\n{blog_content}\n\nUser request: {message}"}
-            ]
-        )
+@app.route('/transcript/<int:post_id>/segments')
+def transcript_segments(post_id):
+    """Timestamped segments of a post's transcript, optionally limited to ?start=&end= seconds.
 
-        # Get the AI's response
-        ai_response = response.choices[0].message.content
+    Each segment carries its character range in the transcript text; 'in_sync'
+    is false once the post has been rewritten so those ranges no longer line up.
+    """
+    post = post_store.get_post(post_id)
+    if post is None:
+        return jsonify({'error': 'Blog post not found'}), 404
+    timeline = post_store.get_timeline(post_id)
+    if timeline is None:
+        return jsonify({'error': 'This transcript has no timestamps'}), 404
 
-        # Update the blog post content
-        app.blog_posts[post_id]['content'] = ai_response
+    start = request.args.get('start', 0.0, type=float)
+    end = request.args.get('end', timeline.duration, type=float)
+    span = timeline.time_range(start, end)
+    return jsonify({
+        'duration': timeline.duration,
+        'in_sync': timeline.text == normalize_transcript(post['content']),
+        'segments': timeline.segments(*span) if span else []
+    })
 
-        return jsonify({'response': ai_response})
+def save_fields(data):
+    """(content, granularity) of a /save-and-next request"""
+    if not data.get('content'):
+        raise RequestError('No content provided')
+    return data['content'], int(data.get('granularity', 3))  # Default to 3 if not specified
 
-    except Exception as e:
-        logging.error(f"Error in chat endpoint: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+def precomputed_topic_cards(post_id, content, granularity):
+    """Cards speculated for this exact transcript, or None; may wait for a generation still running"""
+    topics = topic_speculator.get(content, granularity) if topic_speculator else None
+    if topics is not None:
+        logging.info(f"Using precomputed topic cards for post {post_id}")
+    return topics
 
 @app.route('/save-and-next/<int:post_id>', methods=['POST'])
+@json_errors
 def save_and_next(post_id):
-    try:
-        if not hasattr(app, 'blog_posts') or post_id >= len(app.blog_posts):
-            return jsonify({'error': 'Blog post not found'}), 404
+    require_post(post_id)
+    content, granularity = save_fields(request.json)
 
-        data = request.json
-        content = data.get('content')
-        granularity = data.get('granularity', 3)  # Default to 3 if not specified
-        
-        if not content:
-            return jsonify({'error': 'No content provided'}), 400
+    # Save the updated content
+    post_store.update_content(post_id, content)
 
-        # Save the updated content
-        app.blog_posts[post_id]['content'] = content
+    # Use cards precomputed for this exact transcript if there are any, otherwise
+    # generate them from the transcript with specified granularity
+    topics = precomputed_topic_cards(post_id, content, granularity)
+    if topics is None:
+        topics = generate_topic_cards(normalize_transcript(content), granularity)
 
-        # Generate topic cards from the transcript with specified granularity
-        topics = generate_topic_cards(content, granularity)
-        
-        # Store topic cards in session or app context
-        if not hasattr(app, 'topic_cards'):
-            app.topic_cards = {}
-        app.topic_cards[post_id] = topics
+    post_store.set_topic_cards(post_id, topics)
 
-        # Return the URL for the topic cards page
-        return jsonify({
-            'success': True,
-            'nextUrl': url_for('view_topic_cards', post_id=post_id)
-        })
-
-    except Exception as e:
-        logging.error(f"Error in save_and_next: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+    # Return the URL for the topic cards page
+    return jsonify({
+        'success': True,
+        'nextUrl': url_for('view_topic_cards', post_id=post_id)
+    })
 
 @app.route('/topic-cards/<int:post_id>')
 def view_topic_cards(post_id):
-    if not hasattr(app, 'topic_cards') or post_id not in app.topic_cards:
+    cards = post_store.get_topic_cards(post_id)
+    if cards is None:
         return "Topic cards not found", 404
     
     try:
         return render_template('topiccards.html', 
-                             cards=app.topic_cards[post_id],
+                             cards=cards,
                              post_id=post_id)
     except Exception as e:
         logging.error(f"Error rendering topic cards template: {str(e)}")
         return f"Error rendering topic cards template: {str(e)}", 500
 
-def generate_topic_cards(transcript, granularity=3):
-    """Generate topic cards from the transcript using AI"""
+TOPIC_MODEL = "gpt-4o"
+
+def topic_candidates_request(chunk):
+    return dict(
+        model=TOPIC_MODEL,
+        messages=[
+            {"role": "system", "content": prompts.topiccandidates},
+            {"role": "user", "content": chunk}
+        ],
+        response_format={"type": "json_object"},
+        temperature=0
+    )
+
+def parse_topic_candidates(response):
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": prompts.topiccards},
-                {"role": "user", "content": f"{granularity} grain {transcript}"}
-            ],
-            temperature=0
-        )
+        return json.loads(response).get('topics', [])
+    except ValueError:
+        logging.warning("Topic candidate extraction returned invalid JSON; skipping chunk")
+        return []
 
-        # Process the AI response into structured cards
-        ai_response = response.choices[0].message.content
-        
-        # Split by "Topic N:" pattern
-        import re
-        topics = re.split(r'Topic \d+:', ai_response)[1:]  # Skip the first empty split
-        
-        cards = []
-        for i, topic in enumerate(topics, 1):
-            if ':' in topic:
-                title, content = topic.split(':', 1)
-            else:
-                # If no colon in the topic, treat first line as title
-                lines = topic.strip().split('\n', 1)
-                title = lines[0]
-                content = lines[1] if len(lines) > 1 else ""
-            
-            cards.append({
-                'title': f"Topic {i}: {title.strip()}",
-                'content': content.strip()
-            })
+def topic_chunks(transcript):
+    passages = transcript_patch.split_passages(transcript, target_chars=TOPIC_CHUNK_CHARS)
+    chunks = [transcript[start:end] for start, end in passages]
+    logging.info(f"Generating topics for {len(transcript)} chars in {len(chunks)} chunks")
+    return chunks
 
-        # Ensure we have exactly the requested number of cards
-        if len(cards) != granularity:
-            logging.warning(f"Generated {len(cards)} cards instead of requested {granularity}")
-            # If we got fewer cards than requested, add placeholder cards
-            while len(cards) < granularity:
-                cards.append({
-                    'title': f"Topic {len(cards) + 1}",
-                    'content': "Content needs to be generated for this topic."
-                })
-            # If we got more cards than requested, truncate
-            cards = cards[:granularity]
+def topic_merge_request(candidates_per_chunk, granularity):
+    candidates = '\n'.join(
+        f"- (part {i}) {c.get('title', '').strip()}: {c.get('summary', '').strip()}"
+        for i, chunk_candidates in enumerate(candidates_per_chunk, 1)
+        for c in chunk_candidates
+    )
+    return dict(
+        model=TOPIC_MODEL,
+        messages=[
+            {"role": "system", "content": prompts.topicmerge},
+            {"role": "user", "content": f"{granularity} grain\n\nCandidate topics:\n{candidates}"}
+        ],
+        temperature=0
+    )
 
-        return cards
+def topic_cards_request(transcript, granularity):
+    return dict(
+        model=TOPIC_MODEL,
+        messages=[
+            {"role": "system", "content": prompts.topiccards},
+            {"role": "user", "content": f"{granularity} grain {transcript}"}
+        ],
+        temperature=0
+    )
 
-    except Exception as e:
-        logging.error(f"Error generating topic cards: {str(e)}")
-        raise
+def extract_topic_candidates(chunk):
+    """Map step: candidate topics ({'title', 'summary'}) discussed in one transcript chunk"""
+    return parse_topic_candidates(chat_completion(**topic_candidates_request(chunk)))
 
-@app.route('/merge-topics/<int:post_id>', methods=['POST'])
-def merge_topics(post_id):
-    try:
-        data = request.json
-        card_index = data.get('cardIndex')
-        merged_content = data.get('mergedContent')
+def map_reduce_topics(transcript, granularity):
+    """Extract candidates from each chunk concurrently, then merge them down to ``granularity`` topics.
+
+    Returns the reduce step's response text, in the same "Topic N:" format as a
+    single-call generation.
+    """
+    chunks = topic_chunks(transcript)
+    with tracing.span('topic_map'), ThreadPoolExecutor(max_workers=TOPIC_MAP_WORKERS, thread_name_prefix='topics') as executor:
+        candidates_per_chunk = list(executor.map(extract_topic_candidates, chunks))
+    
+    with tracing.span('topic_reduce'):
+        return chat_completion(**topic_merge_request(candidates_per_chunk, granularity))
 
-        # Get current cards
-        cards = app.topic_cards[post_id]
+def parse_topic_cards(ai_response, granularity):
+    """Structured cards from a "Topic N: title\ncontent" response, padded or truncated to ``granularity``"""
+    # Split by "Topic N:" pattern
+    topics = re.split(r'Topic \d+:', ai_response)[1:]  # Skip the first empty split
+    
+    cards = []
+    for i, topic in enumerate(topics, 1):
+        if ':' in topic:
+            title, content = topic.split(':', 1)
+        else:
+            # If no colon in the topic, treat first line as title
+            lines = topic.strip().split('\n', 1)
+            title = lines[0]
+            content = lines[1] if len(lines) > 1 else ""
         
-        # Create new merged card
-        merged_card = {
-            'title': f"Topic {card_index + 1}: Merged Topics",
-            'content': merged_content
-        }
+        cards.append({
+            'title': f"Topic {i}: {title.strip()}",
+            'content': content.strip()
+        })
+
+    # Ensure we have exactly the requested number of cards
+    if len(cards) != granularity:
+        logging.warning(f"Generated {len(cards)} cards instead of requested {granularity}")
+        # If we got fewer cards than requested, add placeholder cards
+        while len(cards) < granularity:
+            cards.append({
+                'title': f"Topic {len(cards) + 1}",
+                'content': "Content needs to be generated for this topic."
+            })
+        # If we got more cards than requested, truncate
+        cards = cards[:granularity]
 
-        # Remove the two cards being merged and insert the merged card
-        cards.pop(card_index + 1)
-        cards[card_index] = merged_card
+    return cards
 
-        # Renumber remaining cards
-        for i, card in enumerate(cards, 1):
-            card['title'] = f"Topic {i}: {card['title'].split(':', 1)[1].strip()}"
+def generate_topic_cards(transcript, granularity=3):
+    """Generate topic cards from the transcript using AI"""
+    try:
+        with tracing.span('topic_cards'):
+            if len(transcript) > TOPIC_MAP_REDUCE_CHARS:
+                ai_response = map_reduce_topics(transcript, granularity)
+            else:
+                ai_response = chat_completion(**topic_cards_request(transcript, granularity))
 
-        return jsonify({'success': True})
+        # Process the AI response into structured cards
+        return parse_topic_cards(ai_response, granularity)
 
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/split-topic/<int:post_id>', methods=['POST'])
-def split_topic(post_id):
-    try:
-        data = request.json
-        card_index = data.get('cardIndex')
-        content = data.get('content')
-        
-        logging.debug(f"Splitting topic {card_index} with content length: {len(content)}")
+        logging.error(f"Error generating topic cards: {str(e)}")
+        raise
 
-        # Get current cards
-        if not hasattr(app, 'topic_cards') or post_id not in app.topic_cards:
-            logging.error(f"Topic cards not found for post_id: {post_id}")
-            return jsonify({'error': 'Topic cards not found'}), 404
-            
-        cards = app.topic_cards[post_id]
-        logging.debug(f"Current number of cards: {len(cards)}")
+@app.route('/merge-topics/<int:post_id>', methods=['POST'])
+@json_errors
+def merge_topics(post_id):
+    data = request.json
+    update_card(post_id, {'op': 'merge', 'cardIndex': data.get('cardIndex'), 'mergedContent': data.get('mergedContent')})
+    return jsonify({'success': True})
 
-        # Use same format as generate_topic_cards
-        system_prompt = """You are an expert at analyzing content and breaking it down into distinct topics. 
+SPLIT_TOPIC_PROMPT = """You are an expert at analyzing content and breaking it down into distinct topics. 
         Split this content into EXACTLY two distinct topics.
         
         Format requirements:
@@ -408,86 +1093,330 @@ def split_topic(post_id):
         Topic 2: [Clear Title]
         [Detailed content for second topic]"""
 
-        logging.debug("Calling OpenAI API for split")
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Split this content into two clear topics:\n\n{content}"}
-            ],
-            temperature=0
-        )
-
-        split_content = response.choices[0].message.content
-        logging.debug(f"AI Response received. Length: {len(split_content)}")
-        logging.debug(f"AI Response content: {split_content}")
-
-        # Parse the split topics using the same logic as generate_topic_cards
-        import re
-        topics = re.split(r'Topic \d+:', split_content)[1:]  # Skip the first empty split
-        logging.debug(f"Number of topics split: {len(topics)}")
-
-        if len(topics) != 2:
-            logging.error(f"AI generated {len(topics)} topics instead of 2")
-            return jsonify({'error': 'AI did not generate exactly two topics'}), 500
-
-        # Remove the original card
-        cards.pop(card_index)
-        
-        # Insert the two new cards
-        for i, topic in enumerate(topics):
-            if ':' in topic:
-                title, content = topic.split(':', 1)
-            else:
-                lines = topic.strip().split('\n', 1)
-                title = lines[0]
-                content = lines[1] if len(lines) > 1 else ""
-            
-            new_card = {
-                'title': f"Topic {card_index + i + 1}: {title.strip()}",
-                'content': content.strip()
-            }
-            logging.debug(f"Adding new card: {new_card['title']}")
-            cards.insert(card_index + i, new_card)
+def split_topic_request(content):
+    return dict(
+        model=TOPIC_MODEL,
+        messages=[
+            {"role": "system", "content": SPLIT_TOPIC_PROMPT},
+            {"role": "user", "content": f"Split this content into two clear topics:\n\n{content}"}
+        ],
+        temperature=0
+    )
 
-        # Renumber all cards
-        for i, card in enumerate(cards, 1):
-            card['title'] = f"Topic {i}: {card['title'].split(':', 1)[1].strip() if ':' in card['title'] else card['title']}"
+def parse_split_topics(split_content):
+    """The two topics of a split response; raises ValueError if the model didn't return exactly two"""
+    logging.debug(f"AI Response received. Length: {len(split_content)}")
+    logging.debug(f"AI Response content: {split_content}")
+
+    # Parse the split topics using the same logic as generate_topic_cards
+    topics = re.split(r'Topic \d+:', split_content)[1:]  # Skip the first empty split
+    logging.debug(f"Number of topics split: {len(topics)}")
+
+    if len(topics) != 2:
+        logging.error(f"AI generated {len(topics)} topics instead of 2")
+        raise ValueError('AI did not generate exactly two topics')
+    return topics
+
+def split_card(cards, card_index, topics):
+    """Replace ``cards[card_index]`` with the cards for ``topics`` and renumber"""
+    # Remove the original card
+    cards.pop(card_index)
+    
+    # Insert the two new cards
+    for i, topic in enumerate(topics):
+        if ':' in topic:
+            title, content = topic.split(':', 1)
+        else:
+            lines = topic.strip().split('\n', 1)
+            title = lines[0]
+            content = lines[1] if len(lines) > 1 else ""
         
-        logging.debug(f"Final number of cards: {len(cards)}")
-        app.topic_cards[post_id] = cards  # Ensure we save the updated cards
+        new_card = {
+            'title': f"Topic {card_index + i + 1}: {title.strip()}",
+            'content': content.strip()
+        }
+        logging.debug(f"Adding new card: {new_card['title']}")
+        cards.insert(card_index + i, new_card)
 
-        return jsonify({
-            'success': True,
-            'message': 'Topic successfully split'
-        })
+    renumber_cards(cards)
 
-    except Exception as e:
-        logging.error(f"Error in split_topic: {str(e)}")
-        logging.exception("Full traceback:")  # This will log the full stack trace
-        return jsonify({'error': str(e)}), 500
+def renumber_cards(cards):
+    for i, card in enumerate(cards, 1):
+        card['title'] = f"Topic {i}: {card['title'].split(':', 1)[1].strip() if ':' in card['title'] else card['title']}"
+
+def require_topic_cards(post_id):
+    cards = post_store.get_topic_cards(post_id)
+    if cards is None:
+        logging.error(f"Topic cards not found for post_id: {post_id}")
+        raise RequestError('Topic cards not found', 404)
+    return cards
+
+def require_card(post_id, operation):
+    """The stored cards, checked that ``operation`` applies to them"""
+    cards = require_topic_cards(post_id)
+    try:
+        check_card_operation(operation, cards)
+    except ValueError as e:
+        raise RequestError(str(e))
+    return cards
+
+def update_card(post_id, operation, result=None):
+    """Apply one card operation in a transaction and return the new cards.
+
+    The operation is checked against the cards as stored when it is applied,
+    so a stale ``cardIndex`` answers 400 like it does in a batch.
+    """
+    def update(cards):
+        try:
+            check_card_operation(operation, cards)
+        except ValueError as e:
+            raise RequestError(str(e))
+        apply_card_operations(cards, [operation], {0: result})
+
+    cards = post_store.update_topic_cards(post_id, update)
+    if cards is None:
+        raise RequestError('Topic cards not found', 404)
+    return cards
+
+def save_split(post_id, card_index, topics):
+    """Replace card ``card_index`` with ``topics`` and return the new cards"""
+    return update_card(post_id, {'op': 'split', 'cardIndex': card_index}, topics)
+
+@app.route('/split-topic/<int:post_id>', methods=['POST'])
+@json_errors
+def split_topic(post_id):
+    data = request.json
+    card_index = data.get('cardIndex')
+    content = data.get('content')
+
+    cards = require_card(post_id, {'op': 'split', 'cardIndex': card_index})
+    logging.debug(f"Splitting topic {card_index} with content length: {len(content)}")
+    logging.debug(f"Current number of cards: {len(cards)}")
+
+    logging.debug("Calling OpenAI API for split")
+    topics = parse_split_topics(chat_completion(**split_topic_request(content)))
+
+    cards = save_split(post_id, card_index, topics)
+    logging.debug(f"Final number of cards: {len(cards)}")
+
+    return jsonify({
+        'success': True,
+        'message': 'Topic successfully split'
+    })
 
 @app.route('/exclude-topic/<int:post_id>', methods=['POST'])
+@json_errors
 def exclude_topic(post_id):
+    update_card(post_id, {'op': 'exclude', 'cardIndex': request.json.get('cardIndex')})
+    return jsonify({'success': True})
+
+REFINE_CARD_PROMPT = """You are an expert blog editor. Rewrite the content of one topic card following the user's instruction.
+        Keep the card focused on its topic and preserve the speaker's voice.
+        Return only the rewritten content, without the title or any commentary."""
+
+CARD_OPERATIONS = ('split', 'refine', 'merge', 'exclude')
+
+def refine_card_request(title, content, instruction):
+    return dict(
+        model=TOPIC_MODEL,
+        messages=[
+            {"role": "system", "content": REFINE_CARD_PROMPT},
+            {"role": "user", "content": f"Instruction: {instruction}\n\nCard title: {title}\n\nCard content:\n\n{content}"}
+        ],
+        temperature=0
+    )
+
+def check_card_operation(operation, cards):
+    """Raise ValueError if a single card operation can't be applied to ``cards``"""
+    kind = operation.get('op') if isinstance(operation, dict) else None
+    index = operation.get('cardIndex') if isinstance(operation, dict) else None
+    if kind not in CARD_OPERATIONS:
+        raise ValueError(f"op must be one of {', '.join(CARD_OPERATIONS)}")
+    if type(index) is not int or not 0 <= index < len(cards):
+        raise ValueError('cardIndex out of range')
+    if kind == 'merge' and index == len(cards) - 1:
+        raise ValueError("can't merge the last card")
+    if kind == 'refine' and not operation.get('instruction'):
+        raise ValueError('refine needs an instruction')
+
+def parse_card_operations(operations, cards):
+    """Validate a batch against ``cards``; raises ValueError describing the first bad operation.
+
+    Every ``cardIndex`` refers to the cards as they were when the batch was sent,
+    and each card may be touched by at most one operation (a merge touches the
+    card and the one after it).
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('No operations provided')
+    if len(operations) > CARD_BATCH_MAX_OPERATIONS:
+        raise ValueError(f"At most {CARD_BATCH_MAX_OPERATIONS} operations per batch")
+
+    claimed = set()
+    for position, operation in enumerate(operations):
+        try:
+            check_card_operation(operation, cards)
+        except ValueError as e:
+            raise ValueError(f"Operation {position}: {str(e)}")
+
+        index = operation['cardIndex']
+        touched = {index, index + 1} if operation['op'] == 'merge' else {index}
+        if touched & claimed:
+            raise ValueError(f"Operation {position}: card {index} is already changed by another operation")
+        claimed |= touched
+    return operations
+
+def card_operation_request(operation, cards):
+    """Chat completion parameters for an operation, or None if it needs no model call"""
+    card = cards[operation['cardIndex']]
+    content = operation.get('content') or card['content']
+    if operation['op'] == 'split':
+        return split_topic_request(content)
+    if operation['op'] == 'refine':
+        return refine_card_request(card['title'], content, operation['instruction'])
+    return None
+
+def parse_card_result(operation, response):
+    if operation['op'] == 'split':
+        return parse_split_topics(response)
+    return response.strip()
+
+def apply_card_operations(cards, operations, results):
+    """Apply a validated batch in place; ``results`` maps operation positions to parsed model output.
+
+    Operations run from the highest card index down, so splits, merges and
+    exclusions never shift the index of a card that is still to be changed.
+    """
+    order = sorted(range(len(operations)), key=lambda position: operations[position]['cardIndex'], reverse=True)
+    for position in order:
+        operation = operations[position]
+        index = operation['cardIndex']
+        if operation['op'] == 'split':
+            split_card(cards, index, results[position])
+        elif operation['op'] == 'refine':
+            cards[index] = {**cards[index], 'content': results[position]}
+        elif operation['op'] == 'merge':
+            merged_content = operation.get('mergedContent') or f"{cards[index]['content']}\n\n{cards[index + 1]['content']}"
+            cards[index] = {'title': f"Topic {index + 1}: Merged Topics", 'content': merged_content}
+            cards.pop(index + 1)
+        else:
+            cards.pop(index)
+    renumber_cards(cards)
+
+def card_batch(post_id, data):
+    """(snapshot, operations) of a batch request, validated against the stored cards"""
+    snapshot = post_store.get_topic_cards(post_id)
+    if snapshot is None:
+        raise RequestError('Topic cards not found', 404)
     try:
-        data = request.json
-        card_index = data.get('cardIndex')
+        return snapshot, parse_card_operations((data or {}).get('operations'), snapshot)
+    except ValueError as e:
+        raise RequestError(str(e))
 
-        # Get current cards
-        cards = app.topic_cards[post_id]
-        
-        # Remove the card
-        cards.pop(card_index)
+def card_results(post_id, outcomes):
+    """Parsed model output by operation position; raises if any operation failed, so none are applied"""
+    results, failures = {}, []
+    for position, outcome in outcomes.items():
+        if isinstance(outcome, Exception):
+            logging.error(f"Card operation {position} for post {post_id} failed: {str(outcome)}")
+            failures.append({'operation': position, 'error': str(outcome)})
+        else:
+            results[position] = outcome
+    if failures:
+        raise RequestError('Some operations failed; no changes were made', 500, failures=failures)
+    return results
+
+def commit_card_operations(post_id, snapshot, operations, results):
+    """Apply a batch in one transaction and return the new cards; answers 409 if the cards moved under it"""
+    def update(cards):
+        if cards != snapshot:
+            raise RequestError('Topic cards changed while the batch was running; reload and try again', 409)
+        apply_card_operations(cards, operations, results)
+
+    cards = post_store.update_topic_cards(post_id, update)
+    if cards is None:
+        raise RequestError('Topic cards not found', 404)
+    return cards
+
+@app.route('/topic-cards/<int:post_id>/batch', methods=['POST'])
+@json_errors
+def batch_card_operations(post_id):
+    """Run several card operations at once and return the updated cards.
 
-        # Renumber remaining cards
-        for i, card in enumerate(cards, 1):
-            card['title'] = f"Topic {i}: {card['title'].split(':', 1)[1].strip()}"
+    Body: {"operations": [{"op": "split" | "refine" | "merge" | "exclude", "cardIndex": i, ...}]}.
+    Split and refine accept "content" to use instead of the stored card, refine
+    needs an "instruction", and merge accepts "mergedContent". Model calls run
+    concurrently, at most CARD_BATCH_USER_CONCURRENCY at a time per user, and the
+    results are applied together or not at all.
+    """
+    snapshot, operations = card_batch(post_id, request.json)
 
-        return jsonify({'success': True})
+    user = request.remote_addr
+    futures = {}
+    for position, operation in enumerate(operations):
+        params = card_operation_request(operation, snapshot)
+        if params is None:
+            continue
+        # Blocks this request, not the shared workers, while the user is at their cap
+        card_user_limit.acquire(user)
+        futures[position] = card_executor.submit(chat_completion, **params)
+        futures[position].add_done_callback(lambda _: card_user_limit.release(user))
+
+    outcomes = {}
+    for position, future in futures.items():
+        try:
+            outcomes[position] = parse_card_result(operations[position], future.result())
+        except Exception as e:
+            outcomes[position] = e
+
+    cards = commit_card_operations(post_id, snapshot, operations, card_results(post_id, outcomes))
+    return jsonify({'success': True, 'cards': cards})
+
+@app.route('/export/html')
+def export_html():
+    """Stream every post and its topic cards as a zip of static HTML pages.
+
+    A caller that keeps its downloads can pass ?client=<id> to get only the posts
+    changed since that client's last download, to be unpacked over it; ?full=1
+    starts that client over. Without a client every post is included.
+    """
+    client = request.args.get('client')
+    if client is not None and not re.fullmatch(r'[\w-]{1,64}', client):
+        return jsonify({'error': 'client must be 1-64 letters, digits, underscores or hyphens'}), 400
+    full = request.args.get('full') == '1'
+    return Response(
+        stream_with_context(exporter.export_zip(target=client and f"zip:{client}", full=full)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f"attachment; filename=posts-{time.strftime('%Y%m%d-%H%M%S')}.zip"}
+    )
+
+@app.route('/export-to-drive', methods=['POST'])
+def export_to_drive():
+    """Export changed posts into EXPORT_DRIVE_FOLDER in the background.
+
+    The Google Drive client syncing that folder does the upload. Stored posts are
+    exported, so save edits first. A request made while an export is running
+    joins it rather than starting another.
+    """
+    global drive_export
+    try:
+        with drive_export_lock:
+            if drive_export is None or drive_export.done():
+                drive_export = export_executor.submit(exporter.export_to_folder, EXPORT_DRIVE_FOLDER)
+        return jsonify({'success': True, 'folder': EXPORT_DRIVE_FOLDER})
 
     except Exception as e:
+        logging.error(f"Error in export_to_drive: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-if __name__ == '__main__':
-    setup_upload_folder()  # Ensure the uploads directory exists
-    app.run(debug=True)
+@app.route('/export-to-drive/status')
+def export_to_drive_status():
+    with drive_export_lock:
+        export = drive_export
+    if export is None:
+        return jsonify({'status': 'idle'})
+    if not export.done():
+        return jsonify({'status': 'running'})
+    if export.exception() is not None:
+        return jsonify({'status': 'error', 'error': str(export.exception())})
+    exported, total = export.result()
+    return jsonify({'status': 'complete', 'exported': exported, 'total': total})
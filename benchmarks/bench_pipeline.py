@@ -0,0 +1,244 @@
+"""End-to-end pipeline benchmark: synthetic uploads through /upload-audio against the fake OpenAI client.
+
+Usage: python benchmarks/bench_pipeline.py [--minutes 5,30] [--codecs mp3,wav,ogg,m4a] [--concurrency 1,2,4]
+
+For every codec, length and concurrency level, generates distinct synthetic
+recordings with ffmpeg (so the transcription cache never hits), uploads them
+at once through Flask's test client and waits for every job to finish. Reports
+time to first transcribed segment, total wall time, peak RSS of this process,
+the high-water mark of temp files and uploads on disk, and ffmpeg CPU seconds
+split into probe, silence detection and encoding. Per-stage CPU is exact at
+concurrency 1 and aggregated across jobs above that.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import resource
+import tempfile
+import statistics
+from threading import Thread, Event, Lock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ffmpeg
+
+CODECS = {
+    'mp3': {'acodec': 'libmp3lame', 'b:a': '128k'},
+    'wav': {'acodec': 'pcm_s16le'},
+    'ogg': {'acodec': 'libvorbis', 'q:a': 4},
+    'm4a': {'acodec': 'aac', 'b:a': '128k'},
+}
+
+
+def make_audio(path, seconds, codec, seed):
+    """Write a stereo 44.1kHz tone-plus-noise recording; ``seed`` makes every file unique"""
+    tone = ffmpeg.input(f"sine=frequency={180 + seed % 200}:sample_rate=44100:duration={seconds}", f='lavfi')
+    noise = ffmpeg.input(f"anoisesrc=color=pink:amplitude=0.1:seed={seed}:sample_rate=44100:duration={seconds}", f='lavfi')
+    mixed = ffmpeg.filter([tone, noise], 'amix', inputs=2)
+    ffmpeg.run(ffmpeg.output(mixed, path, ac=2, loglevel='error', **CODECS[codec]), overwrite_output=True)
+
+
+def child_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def disk_bytes(*dirs):
+    total = 0
+    for directory in dirs:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass  # Deleted while we were walking
+    return total
+
+
+class Sampler(Thread):
+    """Polls RSS and on-disk scratch usage, keeping the peaks"""
+
+    def __init__(self, dirs, interval=0.05):
+        super().__init__(daemon=True)
+        self.dirs = dirs
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_disk = 0
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+            self.peak_disk = max(self.peak_disk, disk_bytes(*self.dirs))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class StageCPU:
+    """Attributes ffmpeg child CPU time to AudioProcessor stages by wrapping its methods"""
+
+    def __init__(self, processor):
+        self.seconds = {'probe': 0.0, 'silence': 0.0}
+        self.lock = Lock()
+        processor.analyze_audio = self._wrap('probe', processor.analyze_audio)
+        processor.detect_silences = self._wrap('silence', processor.detect_silences)
+
+    def _wrap(self, stage, method):
+        def timed(*args, **kwargs):
+            start = child_cpu_seconds()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.seconds[stage] += child_cpu_seconds() - start
+        return timed
+
+    def reset(self):
+        with self.lock:
+            self.seconds = dict.fromkeys(self.seconds, 0.0)
+
+
+def run_job(backend, test_client, path, result):
+    """Upload one file and wait for its transcription; fills ``result`` with timings"""
+    session_id = uuid.uuid4().hex
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        response = test_client.post('/upload-audio', data={'audio': (f, os.path.basename(path)), 'session_id': session_id},
+                                    content_type='multipart/form-data')
+    # A rejected upload would otherwise be timed as an instant job
+    assert response.status_code == 200, f"Upload of {path} failed: {response.status_code} {response.get_json()}"
+    assert response.get_json().get('session_id') == session_id, f"Upload of {path} started no job: {response.get_json()}"
+    result['upload'] = time.perf_counter() - start
+
+    version, seen = 0, 0
+    while True:
+        version, progress, new_segments = backend.audio_processor.wait_for_progress(session_id, version, seen, timeout=60)
+        if new_segments and 'first_segment' not in result:
+            result['first_segment'] = time.perf_counter() - start
+        seen += len(new_segments)
+        status = (progress or {}).get('status')
+        if status in ('complete', 'error', 'cancelled'):
+            result['wall'] = time.perf_counter() - start
+            if status != 'complete':
+                result['error'] = progress.get('error', status)
+            return
+
+
+def run_level(backend, stage_cpu, sampler_dirs, paths):
+    """Run all ``paths`` concurrently; returns the aggregate measurements"""
+    stage_cpu.reset()
+    sampler = Sampler(sampler_dirs)
+    sampler.start()
+    cpu_start = child_cpu_seconds()
+    wall_start = time.perf_counter()
+
+    results = [{} for _ in paths]
+    threads = [Thread(target=run_job, args=(backend, backend.app.test_client(), path, result))
+               for path, result in zip(paths, results)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    wall = time.perf_counter() - wall_start
+    sampler.stop()
+    # Assertions in run_job only end their own thread, so check every job got as far as a final status
+    unfinished = [path for path, result in zip(paths, results) if 'wall' not in result]
+    assert not unfinished, f"Jobs did not run to completion (see the tracebacks above): {unfinished}"
+    ffmpeg_cpu = child_cpu_seconds() - cpu_start
+    errors = [r['error'] for r in results if 'error' in r]
+    first_segments = [r['first_segment'] for r in results if 'first_segment' in r]
+    return {
+        'jobs': len(paths),
+        'errors': errors,
+        'wall_s': round(wall, 3),
+        'first_segment_median_s': round(statistics.median(first_segments), 3) if first_segments else None,
+        'first_segment_max_s': round(max(first_segments), 3) if first_segments else None,
+        'peak_rss_mb': round(sampler.peak_rss / 1e6, 1),
+        'peak_disk_mb': round(sampler.peak_disk / 1e6, 1),
+        'ffmpeg_cpu_s': {
+            'probe': round(stage_cpu.seconds['probe'], 3),
+            'silence': round(stage_cpu.seconds['silence'], 3),
+            'encode': round(ffmpeg_cpu - sum(stage_cpu.seconds.values()), 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', default='5', help='comma-separated recording lengths')
+    parser.add_argument('--codecs', default='mp3,wav,ogg,m4a')
+    parser.add_argument('--concurrency', default='1', help='comma-separated numbers of simultaneous uploads')
+    parser.add_argument('--latency', type=float, default=0.5, help='fake OpenAI latency per call in seconds')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    lengths = [float(m) for m in args.minutes.split(',')]
+    codecs = args.codecs.split(',')
+    levels = [int(c) for c in args.concurrency.split(',')]
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Isolate the app's uploads, caches and databases, and its temp files so they can be measured
+        scratch = os.path.join(work_dir, 'tmp')
+        os.makedirs(scratch)
+        tempfile.tempdir = scratch
+        os.environ.update({
+            'OPENAI_BACKEND': 'fake',
+            'FAKE_OPENAI_LATENCY': str(args.latency),
+            'SPECULATIVE_TOPIC_CARDS': '0',
+            'JOB_WORKERS': str(max(levels)),
+            'JOB_QUEUE_SIZE': str(max(levels) * 2),
+        })
+        os.chdir(work_dir)
+        import backend
+        backend.logging.getLogger().setLevel(backend.logging.WARNING)
+        stage_cpu = StageCPU(backend.audio_processor)
+
+        sources = os.path.join(work_dir, 'sources')
+        os.makedirs(sources)
+        report, seed = [], 0
+        for codec in codecs:
+            for minutes in lengths:
+                for concurrency in levels:
+                    paths = []
+                    for _ in range(concurrency):
+                        seed += 1
+                        path = os.path.join(sources, f"bench_{seed}.{codec}")
+                        make_audio(path, minutes * 60, codec, seed)
+                        paths.append(path)
+
+                    result = run_level(backend, stage_cpu, [scratch, backend.UPLOAD_FOLDER], paths)
+                    for path in paths:
+                        os.unlink(path)
+                    report.append({'codec': codec, 'minutes': minutes, 'concurrency': concurrency, **result})
+
+                    cpu = result['ffmpeg_cpu_s']
+                    print(f"{codec:>4} {minutes:5g}min x{concurrency:<3} wall {result['wall_s']:7.2f}s  "
+                          f"first segment {result['first_segment_median_s']}s (max {result['first_segment_max_s']}s)  "
+                          f"rss {result['peak_rss_mb']}MB  disk {result['peak_disk_mb']}MB  "
+                          f"ffmpeg cpu probe {cpu['probe']}s silence {cpu['silence']}s encode {cpu['encode']}s"
+                          + (f"  ERRORS {result['errors']}" if result['errors'] else ''))
+
+        print(f"ffmpeg peak RSS (any child): {resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1e3:.1f}MB")
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
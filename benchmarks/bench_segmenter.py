@@ -0,0 +1,78 @@
+"""Compare the single-pass segment muxer, in-memory splitter and per-chunk ffmpeg splitter.
+
+Usage: python benchmarks/bench_segmenter.py [--minutes 60] [--repeat 3]
+
+Generates a synthetic WAV with ffmpeg, splits it with each engine and reports
+wall time, ffmpeg CPU time and the number of segments produced.
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import ffmpeg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from audio_processor import AudioProcessor
+
+
+def make_wav(path, minutes):
+    """Write a stereo 44.1kHz WAV of a warbling tone plus noise"""
+    duration = minutes * 60
+    tone = ffmpeg.input(f"sine=frequency=220:sample_rate=44100:duration={duration}", f='lavfi')
+    noise = ffmpeg.input(f"anoisesrc=color=pink:amplitude=0.1:sample_rate=44100:duration={duration}", f='lavfi')
+    mixed = ffmpeg.filter([tone, noise], 'amix', inputs=2)
+    ffmpeg.run(ffmpeg.output(mixed, path, ac=2, loglevel='error'), overwrite_output=True)
+
+
+def child_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_engine(split, *args):
+    wall_start = time.perf_counter()
+    cpu_start = child_cpu_seconds()
+    segments = 0
+    for segment, _, _ in split(*args):
+        segments += 1
+        segment.release()
+    return time.perf_counter() - wall_start, child_cpu_seconds() - cpu_start, segments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--chunk', type=float, default=180, help='chunk duration in seconds')
+    args = parser.parse_args()
+
+    processor = AudioProcessor()
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, 'source.wav')
+        make_wav(source, args.minutes)
+        duration = float(ffmpeg.probe(source)['format']['duration'])
+        print(f"Source: {args.minutes:g} min WAV, {os.path.getsize(source) / 1e6:.1f} MB")
+
+        engines = {
+            'per-chunk': (processor.split_audio_per_chunk, source, duration, args.chunk),
+            'single-pass': (processor.split_audio_single_pass, source, args.chunk),
+            'in-memory': (processor.split_audio_in_memory, source, args.chunk),
+        }
+        results = {}
+        for name, (split, *split_args) in engines.items():
+            runs = [run_engine(split, *split_args) for _ in range(args.repeat)]
+            wall = min(r[0] for r in runs)
+            cpu = min(r[1] for r in runs)
+            results[name] = (wall, cpu)
+            print(f"{name:>12}: wall {wall:7.2f}s  ffmpeg cpu {cpu:7.2f}s  segments {runs[0][2]}")
+
+        base_wall, base_cpu = results['per-chunk']
+        for name in ('single-pass', 'in-memory'):
+            wall, cpu = results[name]
+            print(f"{name:>12}: speedup wall x{base_wall / wall:.2f}  cpu x{base_cpu / cpu:.2f}")
+
+
+if __name__ == '__main__':
+    main()
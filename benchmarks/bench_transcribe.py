@@ -0,0 +1,85 @@
+"""Compare transcription throughput of the hosted Whisper API and the local faster-whisper backend.
+
+Usage: python benchmarks/bench_transcribe.py [--audio talk.mp3 | --minutes 10] [--backends openai,local]
+
+Splits the audio once with the in-memory splitter, then transcribes every
+segment with each backend and reports wall time and the real-time factor
+(seconds of audio transcribed per second). Use a real recording with --audio
+for meaningful numbers; the synthetic default only exercises the pipeline.
+The openai backend needs OPENAI_API_KEY, or --fake-latency to use the fake client.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from audio_processor import AudioProcessor
+from transcribers import create_transcriber, available_cores
+from upstream import UpstreamClient, create_openai_client
+from fake_openai import FakeOpenAI
+from bench_segmenter import make_wav
+
+
+def build_transcriber(name, args):
+    if name == 'local':
+        return create_transcriber('local', model_size=args.model, cpu_threads=args.threads)
+    if args.fake_latency is not None:
+        return create_transcriber('openai', UpstreamClient(FakeOpenAI(latency=args.fake_latency)))
+    if not os.environ.get('OPENAI_API_KEY'):
+        return None
+    return create_transcriber('openai', UpstreamClient(create_openai_client()))
+
+
+def run_backend(transcriber, segments, concurrency):
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(transcriber.transcribe, [segment for segment, _, _ in segments]))
+    wall = time.perf_counter() - wall_start
+    return wall, sum(len(r) for r in results), sum(len(text) for r in results for _, _, text in r)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--audio', help='recording to transcribe (default: synthetic WAV)')
+    parser.add_argument('--minutes', type=float, default=10, help='length of the synthetic WAV')
+    parser.add_argument('--backends', default='openai,local')
+    parser.add_argument('--chunk', type=float, default=180, help='chunk duration in seconds')
+    parser.add_argument('--concurrency', type=int, default=0, help='segments in flight (default: one per worker)')
+    parser.add_argument('--model', default='base', help='faster-whisper model size')
+    parser.add_argument('--threads', type=int, default=2, help='CPU threads per local worker process')
+    parser.add_argument('--fake-latency', type=float, help='use the fake OpenAI client with this latency')
+    args = parser.parse_args()
+
+    processor = AudioProcessor(encode_bitrate=64000, encode_channels=1, in_memory=True)
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = args.audio
+        if source is None:
+            source = os.path.join(work_dir, 'source.wav')
+            make_wav(source, args.minutes)
+        analysis = processor.analyze_audio(source)
+        segments = list(processor.split_audio_in_memory(source, args.chunk))
+        print(f"Source: {analysis.duration / 60:.1f} min, {len(segments)} segments, {available_cores()} cores")
+
+        for name in args.backends.split(','):
+            transcriber = build_transcriber(name, args)
+            if transcriber is None:
+                print(f"{name:>8}: skipped (set OPENAI_API_KEY or --fake-latency)")
+                continue
+            concurrency = args.concurrency or getattr(transcriber, 'workers', 4)
+            try:
+                # Load the model in every worker before timing
+                if name == 'local':
+                    run_backend(transcriber, segments[:1] * transcriber.workers, transcriber.workers)
+                wall, count, chars = run_backend(transcriber, segments, concurrency)
+            finally:
+                if hasattr(transcriber, 'shutdown'):
+                    transcriber.shutdown()
+            print(f"{name:>8}: wall {wall:7.2f}s  real-time x{analysis.duration / wall:6.1f}  "
+                  f"concurrency {concurrency}  whisper segments {count}  chars {chars}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+from threading import Lock
+
+class DiskCache:
+    """Persistent JSON key/value store in SQLite with a size cap and LRU eviction.
+
+    The total size is tracked in memory, so a put only touches the store when the
+    cap is crossed; eviction then frees down to ``low_water`` of the cap, oldest
+    entries first, so the next puts don't all evict again.
+    """
+
+    def __init__(self, db_path, max_bytes=256*1024*1024, table='cache', low_water=0.9):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.table = table
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_last_used ON {table}(last_used)')
+            self.total = self._stored_bytes()
+
+    def _stored_bytes(self):
+        return self.conn.execute(f'SELECT COALESCE(SUM(size), 0) FROM {self.table}').fetchone()[0]
+
+    def get(self, key):
+        """Cached value, or None"""
+        with self.lock, self.conn:
+            row = self.conn.execute(f'SELECT value FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute(f'UPDATE {self.table} SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        encoded = json.dumps(value)
+        with self.lock, self.conn:
+            row = self.conn.execute(f'SELECT size FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            self.conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, encoded, len(encoded), time.time())
+            )
+            self.total += len(encoded) - (row[0] if row else 0)
+            if self.total > self.max_bytes:
+                self._evict()
+
+    def _evict(self, batch_size=100):
+        """Drop least recently used entries until the store is back under the low-water mark"""
+        # Other processes may share the file, so recount before deciding how much to drop
+        self.total = self._stored_bytes()
+        target = self.max_bytes * self.low_water
+        evicted = 0
+        while self.total > target:
+            rows = self.conn.execute(
+                f'SELECT key, size FROM {self.table} ORDER BY last_used LIMIT ?', (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.total <= target:
+                    break
+                self.conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                self.total -= size
+                evicted += 1
+        logging.info(f"{self.table} cache evicted {evicted} entries")
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute(f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}').fetchone()
+        return {'entries': entries, 'bytes': size, 'hits': self.hits, 'misses': self.misses}
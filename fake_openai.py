@@ -0,0 +1,106 @@
+import io
+import re
+import json
+import time
+import random
+import asyncio
+from types import SimpleNamespace
+from audio_processor import iter_mp3_frames
+
+LOREM = ("so the thing I keep coming back to is that writing things down forces you to think clearly "
+         "and when you publish it other people can push back on it which makes the idea better").split()
+
+def _message(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def _delta(token):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+class FakeOpenAI:
+    """Offline stand-in for the OpenAI client, for load tests and benchmarks.
+
+    Each call sleeps for ``latency`` seconds (plus up to ``jitter``) and returns
+    plausibly shaped output: verbose_json transcriptions, "Topic N:" cards, JSON
+    for json_object requests, and echoed content otherwise.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.0, segment_seconds=10, bitrate=64000):
+        self.latency = latency
+        self.jitter = jitter
+        self.segment_seconds = segment_seconds
+        self.bitrate = bitrate  # Turns upload sizes into durations for uploads that aren't MP3
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+
+    def _delay(self):
+        return self.latency + random.uniform(0, self.jitter)
+
+    def _sleep(self):
+        time.sleep(self._delay())
+
+    def _words(self, count, seed):
+        rng = random.Random(str(seed))  # Tuple seeds are not accepted since Python 3.11
+        return ' '.join(rng.choice(LOREM) for _ in range(count))
+
+    def _transcribe(self, file, **params):
+        audio = file.read()
+        self._sleep()
+        return self._transcript(audio)
+
+    def _transcript(self, audio):
+        # Segments are MP3, so the frame headers give the real duration whatever the encoder settled on
+        size = len(audio)
+        frame_seconds = sum(seconds for _, seconds in iter_mp3_frames(io.BytesIO(audio)))
+        duration = max(1.0, frame_seconds or size * 8 / self.bitrate)
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + self.segment_seconds)
+            segments.append(SimpleNamespace(start=start, end=end, text=self._words(25, (size, start))))
+            start = end
+        return SimpleNamespace(text=' '.join(s.text for s in segments), segments=segments, duration=duration)
+
+    def _chat(self, model, messages, stream=False, **params):
+        self._sleep()
+        content = self._reply(messages, params)
+        if not stream:
+            return _message(content)
+        return (_delta(token) for token in re.findall(r'\S+\s*', content))
+
+    def _reply(self, messages, params):
+        user = messages[-1]['content']
+        if (params.get('response_format') or {}).get('type') == 'json_object':
+            content = json.dumps({'topics': [{'title': self._words(4, user[:50]), 'summary': self._words(20, user[:60])}],
+                                  'edits': []})
+        elif 'Topic N' in messages[0]['content']:
+            match = re.match(r'\s*(\d+) grain', user)
+            count = int(match.group(1)) if match else 2
+            content = '\n\n'.join(f"Topic {i}: {self._words(5, (user[:40], i))}\n{self._words(40, (user[:80], i))}"
+                                  for i in range(1, count + 1))
+        else:
+            content = user
+        return content
+
+class AsyncFakeOpenAI(FakeOpenAI):
+    """FakeOpenAI with awaitable ``create`` methods, standing in for AsyncOpenAI"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat_async))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe_async))
+
+    async def _transcribe_async(self, file, **params):
+        audio = file.read()
+        await asyncio.sleep(self._delay())
+        return self._transcript(audio)
+
+    async def _chat_async(self, model, messages, stream=False, **params):
+        await asyncio.sleep(self._delay())
+        content = self._reply(messages, params)
+        if not stream:
+            return _message(content)
+
+        async def tokens():
+            for token in re.findall(r'\S+\s*', content):
+                yield _delta(token)
+        return tokens()
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import sqlite3
+from threading import local
+from transcript_segments import SegmentTimeline
+
+class CheckpointStore:
+    """Per-segment transcription results persisted as they finish, so failed jobs can resume.
+
+    Segments are keyed by the upload's content hash and start time, so a resumed
+    job (or a re-upload of the same file) only transcribes the time ranges that
+    are still missing. Silences the splitter trimmed are recorded as skipped, so
+    they count as done rather than missing.
+    """
+
+    def __init__(self, db_path, max_age=7*24*3600):
+        self.db_path = db_path
+        self.max_age = max_age
+        self.local = local()
+        
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    session_id TEXT PRIMARY KEY,
+                    file_hash TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_segments (
+                    file_hash TEXT NOT NULL,
+                    start REAL NOT NULL,
+                    end REAL NOT NULL,
+                    text TEXT NOT NULL,
+                    segments TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (file_hash, start)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS skipped_ranges (
+                    file_hash TEXT NOT NULL,
+                    start REAL NOT NULL,
+                    end REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (file_hash, start)
+                )
+            """)
+
+    def _conn(self):
+        """One connection per thread; sqlite3 connections aren't shareable across threads by default"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def start_job(self, session_id, file_hash, file_path, filename):
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO jobs (session_id, file_hash, file_path, filename, status, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (session_id, file_hash, file_path, filename, 'running', time.time())
+            )
+
+    def get_job(self, session_id):
+        row = self._conn().execute(
+            'SELECT session_id, file_hash, file_path, filename, status FROM jobs WHERE session_id = ?', (session_id,)
+        ).fetchone()
+        return dict(zip(('session_id', 'file_hash', 'file_path', 'filename', 'status'), row)) if row else None
+
+    def set_status(self, session_id, status):
+        with self._conn() as conn:
+            conn.execute('UPDATE jobs SET status = ?, updated_at = ? WHERE session_id = ?', (status, time.time(), session_id))
+
+    def save_segment(self, file_hash, start, end, text, segments=None):
+        """Checkpoint a chunk's transcription; ``segments`` are its Whisper (start, end, text) segments in file time"""
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO job_segments (file_hash, start, end, text, segments, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (file_hash, start, end, text, json.dumps(segments) if segments is not None else None, time.time())
+            )
+
+    def save_skipped(self, file_hash, start, end):
+        """Record a span the splitter left out (a trimmed silence) as done"""
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO skipped_ranges (file_hash, start, end, created_at) VALUES (?, ?, ?, ?)',
+                (file_hash, start, end, time.time())
+            )
+
+    def segments(self, file_hash):
+        """Finished (start, end, text) segments in time order"""
+        return self._conn().execute(
+            'SELECT start, end, text FROM job_segments WHERE file_hash = ? ORDER BY start', (file_hash,)
+        ).fetchall()
+
+    def timeline(self, file_hash):
+        """SegmentTimeline of every finished chunk; chunks without Whisper segments count as one segment"""
+        timeline = SegmentTimeline()
+        rows = self._conn().execute(
+            'SELECT start, end, text, segments FROM job_segments WHERE file_hash = ? ORDER BY start', (file_hash,)
+        )
+        for start, end, text, segments in rows:
+            timeline.extend(json.loads(segments) if segments else [(start, end, text)])
+        return timeline
+
+    def missing_ranges(self, file_hash, duration, tolerance=0.5):
+        """(start, end) spans of the file neither covered by a finished segment nor skipped"""
+        done = self._conn().execute("""
+            SELECT start, end FROM job_segments WHERE file_hash = ?
+            UNION ALL SELECT start, end FROM skipped_ranges WHERE file_hash = ?
+            ORDER BY start
+        """, (file_hash, file_hash)).fetchall()
+        ranges, covered = [], 0.0
+        for start, end in done:
+            if start - covered > tolerance:
+                ranges.append((covered, start))
+            covered = max(covered, end)
+        if duration - covered > tolerance:
+            ranges.append((covered, duration))
+        return ranges
+
+    def clear(self, session_id):
+        """Drop a finished job's checkpointed segments; the job row stays until prune()"""
+        with self._conn() as conn:
+            row = conn.execute('SELECT file_hash FROM jobs WHERE session_id = ?', (session_id,)).fetchone()
+            if row is None:
+                return
+            # Another upload of the same file may still be relying on them
+            running = conn.execute(
+                "SELECT 1 FROM jobs WHERE file_hash = ? AND session_id != ? AND status = 'running'", (row[0], session_id)
+            ).fetchone()
+            if running is None:
+                conn.execute('DELETE FROM job_segments WHERE file_hash = ?', (row[0],))
+                conn.execute('DELETE FROM skipped_ranges WHERE file_hash = ?', (row[0],))
+
+    def prune(self):
+        """Forget jobs and segments older than max_age, deleting the uploads kept for resuming those jobs"""
+        cutoff = time.time() - self.max_age
+        with self._conn() as conn:
+            expired = conn.execute('SELECT file_path FROM jobs WHERE updated_at < ?', (cutoff,)).fetchall()
+            conn.execute('DELETE FROM jobs WHERE updated_at < ?', (cutoff,))
+            conn.execute('DELETE FROM job_segments WHERE created_at < ?', (cutoff,))
+            conn.execute('DELETE FROM skipped_ranges WHERE created_at < ?', (cutoff,))
+        for file_path, in expired:
+            if os.path.exists(file_path):
+                os.unlink(file_path)
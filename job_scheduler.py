@@ -0,0 +1,146 @@
+import time
+import logging
+from collections import deque
+from threading import Condition, Event, Thread
+import tracing
+
+class QueueFullError(Exception):
+    """Raised by submit() when the job queue is at capacity"""
+
+class JobExistsError(Exception):
+    """Raised by submit() when the session already has a queued or running job"""
+
+class JobCancelled(Exception):
+    """Raised inside a job that noticed it was cancelled"""
+
+class Job:
+    def __init__(self, session_id, target):
+        self.session_id = session_id
+        self.target = target
+        self.cancel_event = Event()
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.state = 'queued'
+
+class JobScheduler:
+    """Fixed pool of worker threads draining a bounded FIFO queue of jobs.
+
+    Jobs are identified by session ID. Queued jobs can be cancelled outright;
+    running jobs are cancelled cooperatively by polling ``is_cancelled``.
+    """
+
+    def __init__(self, workers=2, max_queue=100, wait_samples=1000):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue = deque()
+        self.jobs = {}
+        self.condition = Condition()
+        self.wait_times = deque(maxlen=wait_samples)
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'rejected': 0}
+        self.running = 0
+        
+        for i in range(workers):
+            Thread(target=self._worker, name=f'job-worker-{i}', daemon=True).start()
+
+    def submit(self, session_id, target):
+        """Queue ``target()`` to run for ``session_id``"""
+        with self.condition:
+            # Replacing the entry would leave the first job untracked and impossible to cancel
+            if session_id in self.jobs:
+                raise JobExistsError(f"A job for session {session_id} is already {self.jobs[session_id].state}")
+            if len(self.queue) >= self.max_queue:
+                self.counters['rejected'] += 1
+                raise QueueFullError(f"Job queue is full ({self.max_queue} waiting)")
+            
+            job = Job(session_id, target)
+            self.jobs[session_id] = job
+            self.queue.append(job)
+            self.counters['submitted'] += 1
+            self.condition.notify()
+        logging.info(f"Queued job {session_id} (queue depth {len(self.queue)})")
+        return job
+
+    def queue_position(self, session_id):
+        """1-based position of a queued job, or None if it isn't waiting"""
+        with self.condition:
+            for position, job in enumerate(self.queue, 1):
+                if job.session_id == session_id:
+                    return position
+        return None
+
+    def cancel(self, session_id):
+        """Cancel a job; returns False if there is no such unfinished job"""
+        with self.condition:
+            job = self.jobs.get(session_id)
+            if job is None or job.state not in ('queued', 'running'):
+                return False
+            
+            job.cancel_event.set()
+            if job.state == 'queued':
+                self.queue.remove(job)
+                job.state = 'cancelled'
+                self.counters['cancelled'] += 1
+                del self.jobs[session_id]
+        logging.info(f"Cancelled job {session_id}")
+        return True
+
+    def is_active(self, session_id):
+        """True while a job for this session is queued or running"""
+        with self.condition:
+            return session_id in self.jobs
+
+    def is_cancelled(self, session_id):
+        with self.condition:
+            job = self.jobs.get(session_id)
+        return job is not None and job.cancel_event.is_set()
+
+    def check_cancelled(self, session_id):
+        if self.is_cancelled(session_id):
+            raise JobCancelled(f"Job {session_id} was cancelled")
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                job = self.queue.popleft()
+                job.state = 'running'
+                job.started_at = time.monotonic()
+                self.wait_times.append(job.started_at - job.submitted_at)
+                self.running += 1
+            
+            tracing.record('queue_wait', job.started_at - job.submitted_at, job.session_id)
+            try:
+                with tracing.bind(job.session_id):
+                    job.target()
+                outcome = 'cancelled' if job.cancel_event.is_set() else 'completed'
+            except Exception as e:
+                logging.error(f"Job {job.session_id} failed: {str(e)}")
+                outcome = 'failed'
+            
+            with self.condition:
+                job.state = outcome
+                self.counters[outcome] += 1
+                self.running -= 1
+                if self.jobs.get(job.session_id) is job:
+                    del self.jobs[job.session_id]
+
+    def metrics(self):
+        with self.condition:
+            waits = sorted(self.wait_times)
+            metrics = {
+                'workers': self.workers,
+                'running': self.running,
+                'queue_depth': len(self.queue),
+                'max_queue': self.max_queue,
+                **self.counters
+            }
+        
+        if waits:
+            metrics['wait_seconds'] = {
+                'avg': sum(waits) / len(waits),
+                'p50': waits[len(waits) // 2],
+                'p95': waits[min(len(waits) - 1, int(len(waits) * 0.95))],
+                'max': waits[-1]
+            }
+        return metrics
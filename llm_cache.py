@@ -0,0 +1,122 @@
+import json
+import asyncio
+import hashlib
+import logging
+from threading import Lock
+from concurrent.futures import Future
+from disk_cache import DiskCache
+
+class LLMResponseCache(DiskCache):
+    """Memoizes deterministic chat completions and coalesces identical in-flight requests.
+
+    Only requests with ``temperature=0`` that aren't streamed are cached; the key
+    covers the model, every message and all other parameters. Concurrent callers
+    with the same key wait on one upstream call.
+    """
+
+    def __init__(self, db_path, max_bytes=64*1024*1024):
+        super().__init__(db_path, max_bytes=max_bytes, table='llm_responses')
+        self.in_flight = {}
+        self.in_flight_lock = Lock()
+        self.coalesced = 0
+
+    @staticmethod
+    def cacheable(params):
+        return params.get('temperature') == 0 and not params.get('stream')
+
+    @staticmethod
+    def request_key(params):
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def _join(self, key):
+        """(future, leader) for ``key``; the leader makes the upstream call and resolves the future"""
+        with self.in_flight_lock:
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self.in_flight[key] = Future()
+            return future, True
+
+    def _leave(self, key):
+        with self.in_flight_lock:
+            self.in_flight.pop(key, None)
+
+    def _abandon(self, key, joined):
+        """Fail and release a leader slot whose async caller was cancelled before it could use it"""
+        future, leader = joined
+        if leader:
+            future.set_exception(RuntimeError("Coalesced request was cancelled"))
+            self._leave(key)
+
+    async def _join_async(self, key):
+        join = asyncio.ensure_future(asyncio.to_thread(self._join, key))
+        try:
+            return await asyncio.shield(join)
+        except asyncio.CancelledError:
+            # The join still completes in its thread; don't leave waiters on a slot nobody will fill
+            join.add_done_callback(lambda join: join.get_loop().run_in_executor(None, self._abandon, key, join.result()))
+            raise
+
+    def complete(self, client, **params):
+        """Text of ``client.chat.completions.create(**params)``, from the cache when possible"""
+        if not self.cacheable(params):
+            return client.chat.completions.create(**params).choices[0].message.content
+        
+        key = self.request_key(params)
+        cached = self.get(key)
+        if cached is not None:
+            logging.debug(f"LLM cache hit for {params.get('model')}")
+            return cached
+        
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        
+        try:
+            content = client.chat.completions.create(**params).choices[0].message.content
+            self.put(key, content)
+            future.set_result(content)
+            return content
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+
+    async def complete_async(self, client, **params):
+        """``complete`` for an async client; identical requests coalesce with sync callers too.
+
+        The SQLite store and the in-flight lock are shared with threads, so they're
+        only touched from worker threads, never on the event loop.
+        """
+        if not self.cacheable(params):
+            return (await client.chat.completions.create(**params)).choices[0].message.content
+        
+        key = self.request_key(params)
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            logging.debug(f"LLM cache hit for {params.get('model')}")
+            return cached
+        
+        future, leader = await self._join_async(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        
+        try:
+            content = (await client.chat.completions.create(**params)).choices[0].message.content
+            await asyncio.to_thread(self.put, key, content)
+            future.set_result(content)
+            return content
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except asyncio.CancelledError:
+            # The client went away; don't leave coalesced waiters hanging
+            future.set_exception(RuntimeError("Coalesced request was cancelled"))
+            raise
+        finally:
+            await asyncio.to_thread(self._leave, key)
+
+    def stats(self):
+        return {**super().stats(), 'coalesced': self.coalesced}
@@ -0,0 +1,28 @@
+from bisect import bisect_left
+from threading import Lock
+
+class LatencyHistogram:
+    """Cumulative latency histogram with Prometheus-style buckets (seconds)"""
+
+    BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.counts[bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        with self.lock:
+            cumulative, total = {}, 0
+            for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+                total += count
+                cumulative[str(bound)] = total
+            return {'buckets': cumulative, 'count': self.count, 'sum': self.sum}
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import sqlite3
+from collections import OrderedDict
+from threading import Lock, local
+from transcript_segments import SegmentTimeline
+
+class PostStore:
+    """SQLite-backed blog posts and topic cards with an in-memory LRU of hot posts.
+
+    Post IDs come from SQLite's INTEGER PRIMARY KEY, so concurrent writers (threads
+    or worker processes) never hand out the same ID. Cached posts are checked
+    against the row's ``updated_at`` on every read, so a write from another worker
+    process is never served stale; a hit only saves reading the content.
+    """
+
+    def __init__(self, db_path, cache_size=256):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = Lock()
+        self.local = local()
+        
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS posts (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS precomputed_cards (
+                    content_hash TEXT NOT NULL,
+                    granularity INTEGER NOT NULL,
+                    cards TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (content_hash, granularity)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcript_segments (
+                    post_id INTEGER PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+                    timeline TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS topic_cards (
+                    post_id INTEGER PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+                    cards TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def _conn(self):
+        """One connection per thread; sqlite3 connections aren't shareable across threads by default"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self.local.conn = conn
+        return conn
+
+    def _cache_put(self, post_id, updated_at, post):
+        with self.cache_lock:
+            self.cache[post_id] = (updated_at, post)
+            self.cache.move_to_end(post_id)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _cache_drop(self, post_id):
+        with self.cache_lock:
+            self.cache.pop(post_id, None)
+
+    def create_post(self, title, keyword, content, timeline=None):
+        """Insert a post (and its transcript's SegmentTimeline, if any) and return its ID"""
+        now = time.time()
+        with self._conn() as conn:
+            cursor = conn.execute(
+                'INSERT INTO posts (title, keyword, content, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (title, keyword, content, now, now)
+            )
+            post_id = cursor.lastrowid
+            if timeline is not None:
+                conn.execute(
+                    'INSERT INTO transcript_segments (post_id, timeline, updated_at) VALUES (?, ?, ?)',
+                    (post_id, timeline.to_json(), now)
+                )
+        self._cache_put(post_id, now, {'id': post_id, 'title': title, 'keyword': keyword, 'content': content})
+        return post_id
+
+    def get_post(self, post_id):
+        """Post dict ({'id', 'title', 'keyword', 'content'}) or None"""
+        conn = self._conn()
+        row = conn.execute('SELECT updated_at FROM posts WHERE id = ?', (post_id,)).fetchone()
+        if row is None:
+            self._cache_drop(post_id)
+            return None
+        
+        with self.cache_lock:
+            cached = self.cache.get(post_id)
+            if cached is not None and cached[0] == row[0]:
+                self.cache.move_to_end(post_id)
+                return dict(cached[1])
+        
+        row = conn.execute(
+            'SELECT id, title, keyword, content, updated_at FROM posts WHERE id = ?', (post_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        post = dict(zip(('id', 'title', 'keyword', 'content'), row))
+        self._cache_put(post_id, row[4], post)
+        return dict(post)
+
+    def iter_posts(self, batch_size=200):
+        """Every post in ID order, each with its topic cards (or None) under 'cards'.
+
+        Reads ``batch_size`` posts at a time by keyset pagination, so a full scan
+        never holds more than one batch in memory and skips the LRU.
+        """
+        last_id = 0
+        while True:
+            rows = self._conn().execute("""
+                SELECT posts.id, posts.title, posts.keyword, posts.content, topic_cards.cards
+                FROM posts LEFT JOIN topic_cards ON topic_cards.post_id = posts.id
+                WHERE posts.id > ? ORDER BY posts.id LIMIT ?
+            """, (last_id, batch_size)).fetchall()
+            for post_id, title, keyword, content, cards in rows:
+                yield {'id': post_id, 'title': title, 'keyword': keyword, 'content': content,
+                       'cards': json.loads(cards) if cards else None}
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def update_content(self, post_id, content):
+        """Replace a post's content; returns False if the post doesn't exist"""
+        with self._conn() as conn:
+            updated = conn.execute(
+                'UPDATE posts SET content = ?, updated_at = ? WHERE id = ?', (content, time.time(), post_id)
+            ).rowcount
+        # Other processes see the new updated_at on their next read and refetch
+        self._cache_drop(post_id)
+        return updated > 0
+
+    def get_timeline(self, post_id):
+        """The post's SegmentTimeline, or None for posts without timestamps"""
+        row = self._conn().execute('SELECT timeline FROM transcript_segments WHERE post_id = ?', (post_id,)).fetchone()
+        return SegmentTimeline.from_json(row[0]) if row else None
+
+    def set_timeline(self, post_id, timeline):
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO transcript_segments (post_id, timeline, updated_at) VALUES (?, ?, ?)',
+                (post_id, timeline.to_json(), time.time())
+            )
+
+    def get_topic_cards(self, post_id):
+        row = self._conn().execute('SELECT cards FROM topic_cards WHERE post_id = ?', (post_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_topic_cards(self, post_id, cards):
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO topic_cards (post_id, cards, updated_at) VALUES (?, ?, ?)',
+                (post_id, json.dumps(cards), time.time())
+            )
+
+    def update_topic_cards(self, post_id, update):
+        """Atomically apply ``update(cards)`` to a post's cards and return the result.
+
+        ``update`` may mutate the list in place or return a new one. Returns None
+        if the post has no cards.
+        """
+        conn = self._conn()
+        with conn:
+            # Hold the write lock across read-modify-write so concurrent edits can't interleave
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT cards FROM topic_cards WHERE post_id = ?', (post_id,)).fetchone()
+            if row is None:
+                return None
+            cards = json.loads(row[0])
+            result = update(cards)
+            cards = cards if result is None else result
+            conn.execute(
+                'UPDATE topic_cards SET cards = ?, updated_at = ? WHERE post_id = ?',
+                (json.dumps(cards), time.time(), post_id)
+            )
+        return cards
+
+    def get_precomputed_cards(self, content_hash, granularity):
+        """Topic cards generated ahead of time for this exact transcript, or None"""
+        row = self._conn().execute(
+            'SELECT cards FROM precomputed_cards WHERE content_hash = ? AND granularity = ?',
+            (content_hash, granularity)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_precomputed_cards(self, content_hash, granularity, cards):
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO precomputed_cards (content_hash, granularity, cards, created_at) VALUES (?, ?, ?, ?)',
+                (content_hash, granularity, json.dumps(cards), time.time())
+            )
+
+    def prune_precomputed_cards(self, max_age):
+        """Drop speculative results older than ``max_age`` seconds"""
+        with self._conn() as conn:
+            return conn.execute('DELETE FROM precomputed_cards WHERE created_at < ?', (time.time() - max_age,)).rowcount
@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+from threading import Condition, Lock, local
+
+FINISHED_STATUSES = ('complete', 'error', 'cancelled')
+
+class MemoryProgressStore:
+    """Per-process progress store with striped locks and TTL eviction.
+
+    Sessions hash onto one of ``stripes`` condition variables, so unrelated
+    sessions rarely contend. Finished sessions are dropped ``finished_ttl``
+    seconds after they finish and abandoned ones after ``idle_ttl``.
+    """
+
+    def __init__(self, stripes=16, finished_ttl=3600, idle_ttl=24*3600, sweep_interval=60):
+        self.stripes = [Condition(Lock()) for _ in range(stripes)]
+        self.sessions = [{} for _ in range(stripes)]
+        self.finished_ttl = finished_ttl
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.last_sweep = time.monotonic()
+        self.sweep_lock = Lock()
+
+    def _stripe(self, session_id):
+        index = zlib.crc32(session_id.encode()) % len(self.stripes)
+        return self.stripes[index], self.sessions[index]
+
+    def _touch(self, entry, condition):
+        # Caller holds the stripe's condition
+        entry['version'] += 1
+        entry['updated_at'] = time.monotonic()
+        if entry['progress'].get('status') not in FINISHED_STATUSES:
+            entry['finished_at'] = None
+        elif entry['finished_at'] is None:
+            entry['finished_at'] = entry['updated_at']
+        condition.notify_all()
+
+    def _entry(self, sessions, session_id):
+        if session_id not in sessions:
+            sessions[session_id] = {'progress': {}, 'segments': [], 'version': 0,
+                                    'updated_at': time.monotonic(), 'finished_at': None}
+        return sessions[session_id]
+
+    def set(self, session_id, progress):
+        condition, sessions = self._stripe(session_id)
+        with condition:
+            entry = self._entry(sessions, session_id)
+            entry['progress'] = dict(progress)
+            self._touch(entry, condition)
+        self._maybe_sweep()
+
+    def merge(self, session_id, fields):
+        condition, sessions = self._stripe(session_id)
+        with condition:
+            entry = sessions.get(session_id)
+            if entry is None:
+                return
+            entry['progress'].update(fields)
+            self._touch(entry, condition)
+
+    def append_segment(self, session_id, segment):
+        condition, sessions = self._stripe(session_id)
+        with condition:
+            entry = self._entry(sessions, session_id)
+            entry['segments'].append(segment)
+            self._touch(entry, condition)
+
+    def clear_segments(self, session_id):
+        condition, sessions = self._stripe(session_id)
+        with condition:
+            entry = sessions.get(session_id)
+            if entry is None:
+                return
+            entry['segments'] = []
+            self._touch(entry, condition)
+
+    def get(self, session_id):
+        condition, sessions = self._stripe(session_id)
+        with condition:
+            entry = sessions.get(session_id)
+            return dict(entry['progress']) if entry and entry['progress'] else None
+
+    def wait(self, session_id, since_version, segments_seen=0, timeout=15):
+        condition, sessions = self._stripe(session_id)
+        with condition:
+            condition.wait_for(
+                lambda: sessions.get(session_id, {}).get('version', 0) != since_version, timeout=timeout
+            )
+            entry = sessions.get(session_id)
+            if entry is None or not entry['progress']:
+                return 0, None, []
+            return entry['version'], dict(entry['progress']), entry['segments'][segments_seen:]
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self.last_sweep < self.sweep_interval or not self.sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self.last_sweep = now
+            self.evict_expired(now)
+        finally:
+            self.sweep_lock.release()
+
+    def evict_expired(self, now=None):
+        """Drop finished sessions past finished_ttl and idle ones past idle_ttl"""
+        now = now if now is not None else time.monotonic()
+        evicted = 0
+        for condition, sessions in zip(self.stripes, self.sessions):
+            with condition:
+                for session_id in [sid for sid, entry in sessions.items() if self._expired(entry, now)]:
+                    del sessions[session_id]
+                    evicted += 1
+        if evicted:
+            logging.info(f"Evicted {evicted} expired progress sessions")
+        return evicted
+
+    def _expired(self, entry, now):
+        if entry['finished_at'] is not None:
+            return now - entry['finished_at'] > self.finished_ttl
+        return now - entry['updated_at'] > self.idle_ttl
+
+class SQLiteProgressStore:
+    """Progress store shared by every worker process through a SQLite database in WAL mode.
+
+    Cross-process writers can't signal a condition variable, so ``wait``
+    polls the session's version every ``poll_interval`` seconds.
+    """
+
+    def __init__(self, db_path, finished_ttl=3600, idle_ttl=24*3600, sweep_interval=60, poll_interval=0.25):
+        self.db_path = db_path
+        self.finished_ttl = finished_ttl
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.poll_interval = poll_interval
+        self.last_sweep = time.time()
+        self.local = local()
+        
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS progress (
+                    session_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS progress_segments (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                )
+            """)
+
+    def _conn(self):
+        """One connection per thread; sqlite3 connections aren't shareable across threads by default"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def _write(self, conn, session_id, progress):
+        now = time.time()
+        finished_at = now if progress.get('status') in FINISHED_STATUSES else None
+        conn.execute("""
+            INSERT INTO progress (session_id, data, version, updated_at, finished_at) VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                data = excluded.data,
+                version = version + 1,
+                updated_at = excluded.updated_at,
+                finished_at = CASE WHEN excluded.finished_at IS NULL THEN NULL ELSE COALESCE(finished_at, excluded.finished_at) END
+        """, (session_id, json.dumps(progress), now, finished_at))
+
+    def set(self, session_id, progress):
+        with self._conn() as conn:
+            self._write(conn, session_id, progress)
+        self._maybe_sweep()
+
+    def merge(self, session_id, fields):
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE takes the write lock so concurrent merges don't lose fields
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT data FROM progress WHERE session_id = ?', (session_id,)).fetchone()
+            if row is None:
+                return
+            self._write(conn, session_id, {**json.loads(row[0]), **fields})
+
+    def append_segment(self, session_id, segment):
+        with self._conn() as conn:
+            conn.execute("""
+                INSERT INTO progress_segments (session_id, seq, data)
+                SELECT ?, COALESCE(MAX(seq), -1) + 1, ? FROM progress_segments WHERE session_id = ?
+            """, (session_id, json.dumps(segment), session_id))
+            conn.execute('UPDATE progress SET version = version + 1, updated_at = ? WHERE session_id = ?',
+                         (time.time(), session_id))
+
+    def clear_segments(self, session_id):
+        with self._conn() as conn:
+            conn.execute('DELETE FROM progress_segments WHERE session_id = ?', (session_id,))
+            conn.execute('UPDATE progress SET version = version + 1, updated_at = ? WHERE session_id = ?',
+                         (time.time(), session_id))
+
+    def get(self, session_id):
+        row = self._conn().execute('SELECT data FROM progress WHERE session_id = ?', (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def wait(self, session_id, since_version, segments_seen=0, timeout=15):
+        conn = self._conn()
+        deadline = time.monotonic() + timeout
+        while True:
+            row = conn.execute('SELECT data, version FROM progress WHERE session_id = ?', (session_id,)).fetchone()
+            if row is None:
+                return 0, None, []
+            if row[1] != since_version or time.monotonic() >= deadline:
+                break
+            time.sleep(self.poll_interval)
+        
+        segments = conn.execute(
+            'SELECT data FROM progress_segments WHERE session_id = ? AND seq >= ? ORDER BY seq',
+            (session_id, segments_seen)
+        ).fetchall()
+        return row[1], json.loads(row[0]), [json.loads(s[0]) for s in segments]
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self.last_sweep >= self.sweep_interval:
+            self.last_sweep = now
+            self.evict_expired(now)
+
+    def evict_expired(self, now=None):
+        """Drop finished sessions past finished_ttl and idle ones past idle_ttl"""
+        now = now if now is not None else time.time()
+        with self._conn() as conn:
+            expired = [r[0] for r in conn.execute("""
+                SELECT session_id FROM progress
+                WHERE (finished_at IS NOT NULL AND finished_at < ?) OR (finished_at IS NULL AND updated_at < ?)
+            """, (now - self.finished_ttl, now - self.idle_ttl))]
+            conn.executemany('DELETE FROM progress WHERE session_id = ?', [(sid,) for sid in expired])
+            conn.executemany('DELETE FROM progress_segments WHERE session_id = ?', [(sid,) for sid in expired])
+        if expired:
+            logging.info(f"Evicted {len(expired)} expired progress sessions")
+        return len(expired)
+
+def create_progress_store(backend='memory', db_path='cache/progress.db', **kwargs):
+    """Build the configured progress store backend ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        return MemoryProgressStore(**kwargs)
+    if backend == 'sqlite':
+        return SQLiteProgressStore(db_path, **kwargs)
+    raise ValueError(f"Unknown progress store backend: {backend}")
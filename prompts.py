@@ -50,4 +50,29 @@ Provide a list of suggested blog topics according to the user's preferred granul
 (Note: Adjust the number of blog topics according to the granularity specified by the user.)
 
 ONLY OUTPUT THE TOPICS, BEGIN:
-"""
\ No newline at end of file
+"""
+topiccandidates="""
+You are reading one excerpt of a longer transcript. List the distinct subjects discussed in this excerpt that could become blog topics, considering both what is said and the underlying motivations for sharing it (first principles, 4th layer effects such as career growth, authority or thought leadership).
+
+Respond with JSON only, in this shape:
+{"topics": [{"title": "Concise title (3-10 words)", "summary": "One or two sentences on what the excerpt says and why it would be valuable to publish"}]}
+
+List at most 8 topics, most substantial first. Do not invent subjects the excerpt doesn't discuss.
+"""
+
+topicmerge="""
+You are given candidate blog topics extracted from consecutive excerpts of one long transcript, in order. Merge duplicates and closely related candidates, then choose the strongest topics for the whole transcript, following the user's requested granularity (the number of topics to produce).
+
+# Output Format
+
+- Each card must start with "Topic N: " where N is the topic number
+- Each card must be separated by TWO newlines
+- Each topic must have a clear title and detailed content
+        
+        Example format:
+        Topic 1: [Title]
+        [Content for topic 1]
+
+        Topic 2: [Title]
+        [Content for topic 2]
+"""
@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import zipfile
+from collections import deque
+from threading import local
+from concurrent.futures import ThreadPoolExecutor
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+EXPORT_TEMPLATES = ('post.html', 'index.html')
+
+def post_filename(post):
+    slug = re.sub(r'[^a-z0-9]+', '-', post['title'].lower()).strip('-')[:60] or 'post'
+    return f"posts/{post['id']}-{slug}.html"
+
+class ExportState:
+    """Content hash of every post as of its last export, per export target"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = local()
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS exported_posts (
+                    target TEXT NOT NULL,
+                    post_id INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    exported_at REAL NOT NULL,
+                    PRIMARY KEY (target, post_id)
+                )
+            """)
+
+    def _conn(self):
+        """One connection per thread; sqlite3 connections aren't shareable across threads by default"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def exported(self, target):
+        """{post_id: (content_hash, filename)} for everything last exported to ``target``"""
+        rows = self._conn().execute(
+            'SELECT post_id, content_hash, filename FROM exported_posts WHERE target = ?', (target,)
+        )
+        return {post_id: (content_hash, filename) for post_id, content_hash, filename in rows}
+
+    def mark(self, target, entries):
+        """Record ``entries`` ([(post_id, content_hash, filename)]) as exported to ``target``"""
+        now = time.time()
+        with self._conn() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO exported_posts (target, post_id, content_hash, filename, exported_at) VALUES (?, ?, ?, ?, ?)',
+                [(target, post_id, content_hash, filename, now) for post_id, content_hash, filename in entries]
+            )
+
+class _ZipSink:
+    """Write-only file object that hands compressed bytes back to a streaming response.
+
+    ZipFile detects that it can't seek and writes data descriptors instead of
+    patching headers, so the archive never has to be held in memory or on disk.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+class StaticExporter:
+    """Renders every post and its topic cards to static HTML, plus an index page.
+
+    Posts are read from the store in batches and rendered on a thread pool with
+    a bounded window, so memory stays flat however many posts there are. A post
+    whose content hash (title, content, cards and export templates) matches its
+    last export to the same target is skipped; the index always lists every post.
+    """
+
+    def __init__(self, post_store, template_folder, state_db_path, workers=4, batch_size=200):
+        self.post_store = post_store
+        self.state = ExportState(state_db_path)
+        self.workers = workers
+        self.batch_size = batch_size
+        template_folder = os.path.join(template_folder, 'export')
+        self.env = Environment(loader=FileSystemLoader(template_folder), autoescape=select_autoescape(['html']))
+
+        # Editing a template invalidates every previous export
+        digest = hashlib.sha256()
+        for name in EXPORT_TEMPLATES:
+            with open(os.path.join(template_folder, name), 'rb') as f:
+                digest.update(f.read())
+        self.template_hash = digest.hexdigest()
+
+    def content_hash(self, post):
+        fields = {key: post[key] for key in ('title', 'keyword', 'content', 'cards')}
+        return hashlib.sha256((json.dumps(fields, sort_keys=True) + self.template_hash).encode()).hexdigest()
+
+    def render_post(self, post):
+        return self.env.get_template('post.html').render(post=post, cards=post['cards'] or [])
+
+    def render_index(self, entries):
+        return self.env.get_template('index.html').render(posts=entries, generated_at=time.strftime('%Y-%m-%d %H:%M'))
+
+    def _rendered(self, previous, full):
+        """(post_id, title, filename, content_hash, html or None if unchanged) for every post, in ID order"""
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export') as executor:
+            window = deque()
+            for post in self.post_store.iter_posts(self.batch_size):
+                content_hash = self.content_hash(post)
+                changed = full or previous.get(post['id'], (None,))[0] != content_hash
+                future = executor.submit(self.render_post, post) if changed else None
+                window.append((post['id'], post['title'], post_filename(post), content_hash, future))
+                if len(window) >= self.workers * 4:
+                    *entry, future = window.popleft()
+                    yield (*entry, future and future.result())
+            while window:
+                *entry, future = window.popleft()
+                yield (*entry, future and future.result())
+
+    def export_zip(self, target=None, full=False):
+        """Generator of zip archive bytes for a streaming response.
+
+        Without a ``target`` the archive holds every post and nothing is recorded.
+        With one (and unless ``full``), it only holds posts that changed since the
+        last export to that target, to be unpacked over the previous archive. The
+        export is recorded once the last byte has been produced, so an aborted
+        download is redone.
+        """
+        full = full or target is None
+        previous = {} if full else self.state.exported(target)
+        sink = _ZipSink()
+        index, exported = [], []
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for post_id, title, filename, content_hash, html in self._rendered(previous, full):
+                index.append({'title': title, 'filename': filename})
+                if html is None:
+                    continue
+                archive.writestr(filename, html)
+                exported.append((post_id, content_hash, filename))
+                data = sink.take()
+                if data:
+                    yield data
+            archive.writestr('index.html', self.render_index(index))
+        yield sink.take()
+
+        if target is not None:
+            self.state.mark(target, exported)
+        logging.info(f"Exported {len(exported)} of {len(index)} posts to {target or 'a full zip'}")
+
+    def export_to_folder(self, folder, full=False):
+        """Write changed posts and the index into ``folder``; returns (exported, total)"""
+        target = f"folder:{os.path.abspath(folder)}"
+        previous = self.state.exported(target)
+        os.makedirs(os.path.join(folder, 'posts'), exist_ok=True)
+        index, exported = [], []
+        for post_id, title, filename, content_hash, html in self._rendered(previous, full):
+            index.append({'title': title, 'filename': filename})
+            if html is None:
+                continue
+            self._write(folder, filename, html)
+            old_filename = previous.get(post_id, (None, None))[1]
+            if old_filename and old_filename != filename:
+                # The title changed, so the page moved
+                try:
+                    os.unlink(os.path.join(folder, old_filename))
+                except FileNotFoundError:
+                    pass
+            exported.append((post_id, content_hash, filename))
+        self._write(folder, 'index.html', self.render_index(index))
+
+        self.state.mark(target, exported)
+        logging.info(f"Exported {len(exported)} of {len(index)} posts to {folder}")
+        return len(exported), len(index)
+
+    def _write(self, folder, filename, html):
+        # Write then rename, so a sync client never picks up a half-written page
+        path = os.path.join(folder, filename)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        os.replace(temp_path, path)
@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+@pytest.fixture(scope='session')
+def backend(tmp_path_factory):
+    """The Flask app module, on the fake OpenAI client with every store in a temp directory"""
+    work_dir = tmp_path_factory.mktemp('backend')
+    os.environ.update({
+        'OPENAI_BACKEND': 'fake',
+        'FAKE_OPENAI_LATENCY': '0',
+        'POST_DB_PATH': str(work_dir / 'posts.db'),
+        'LLM_CACHE_PATH': str(work_dir / 'llm.db'),
+        'CHECKPOINT_DB_PATH': str(work_dir / 'checkpoints.db'),
+        'TRANSCRIPTION_CACHE_PATH': str(work_dir / 'transcriptions.db'),
+        'EXPORT_STATE_PATH': str(work_dir / 'exports.db'),
+    })
+    import backend
+    return backend
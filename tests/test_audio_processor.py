@@ -0,0 +1,97 @@
+import time
+import shutil
+import tempfile
+import pytest
+import ffmpeg
+from audio_processor import AudioProcessor, mp3_encoder_settings
+from fake_openai import FakeOpenAI
+
+needs_ffmpeg = pytest.mark.skipif(not (shutil.which('ffmpeg') and shutil.which('ffprobe')),
+                                  reason='ffmpeg and ffprobe are not installed')
+
+
+def make_audio(path, seconds, sample_rate):
+    noise = ffmpeg.input(f"anoisesrc=color=pink:amplitude=0.3:sample_rate={sample_rate}:duration={seconds}", f='lavfi')
+    ffmpeg.run(ffmpeg.output(noise, path, ac=2, loglevel='error'), overwrite_output=True)
+
+
+@pytest.mark.parametrize('sample_rate, bitrate, expected', [
+    (44100, 64000, (44100, 64000)),
+    (44100, 100000, (44100, 96000)),
+    (44100, 8000, (44100, 32000)),  # MPEG-1 starts at 32k
+    (16000, 192000, (16000, 160000)),  # MPEG-2 tops out at 160k
+    (8000, 192000, (8000, 64000)),  # MPEG-2.5 tops out at 64k
+    (96000, 192000, (48000, 192000)),  # Resampled to the nearest MP3 rate
+    (0, 64000, (44100, 64000)),  # Sample rate unknown
+])
+def test_mp3_encoder_settings(sample_rate, bitrate, expected):
+    assert mp3_encoder_settings(sample_rate, bitrate) == expected
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize('sample_rate, bitrate', [(44100, 64000), (44100, 192000), (8000, 192000)])
+@pytest.mark.parametrize('mode', ['memory', 'single_pass', 'per_chunk'])
+def test_segment_sizes_match_prediction(tmp_path, sample_rate, bitrate, mode):
+    source = str(tmp_path / 'source.wav')
+    make_audio(source, 50, sample_rate)
+    processor = AudioProcessor(encode_bitrate=bitrate, encode_channels=1, optimal_duration=20, fallback_duration=10,
+                               in_memory=mode == 'memory', single_pass=mode == 'single_pass')
+
+    analysis = processor.analyze_audio(source)
+    assert analysis.encoded_bitrate == mp3_encoder_settings(sample_rate, bitrate)[1]
+
+    segments = list(processor.split_audio_streaming(source, analysis))
+    try:
+        assert len(segments) == 3
+        for segment, start, end in segments:
+            predicted = processor.predicted_segment_size(end - start, analysis)
+            assert abs(segment.size - predicted) <= predicted * 0.05 + 2048
+            probed = ffmpeg.probe(segment.path) if segment.path else None
+            if probed:
+                assert int(probed['streams'][0]['bit_rate']) == analysis.encoded_bitrate
+    finally:
+        for segment, _, _ in segments:
+            segment.release()
+
+
+@needs_ffmpeg
+def test_disk_segmenter_waits_for_consumer(tmp_path, monkeypatch):
+    source = str(tmp_path / 'source.wav')
+    make_audio(source, 120, 44100)
+    scratch = tmp_path / 'scratch'
+    scratch.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(scratch))
+    processor = AudioProcessor(encode_bitrate=64000, optimal_duration=5, fallback_duration=5, segmenter_lookahead=2)
+
+    segments = processor.split_audio_streaming(source)
+    first, _, _ = next(segments)
+    time.sleep(1)  # Long enough to encode every segment if nothing held ffmpeg back
+    # The segment taken, two waiting and at most one being written
+    assert len(list(scratch.iterdir())) <= 4
+
+    first.release()
+    remaining = list(segments)
+    assert remaining[-1][2] == pytest.approx(120, abs=0.1)
+    for segment, _, _ in remaining:
+        segment.release()
+    assert not list(scratch.iterdir())
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize('sample_rate', [44100, 8000])
+def test_fake_transcript_duration_matches_probed_segment(tmp_path, sample_rate):
+    source = str(tmp_path / 'source.wav')
+    make_audio(source, 30, sample_rate)
+    processor = AudioProcessor(encode_bitrate=192000, encode_channels=1, optimal_duration=20, fallback_duration=10)
+    # The fake is told a different bitrate than the encoder uses, so only real frame timing can match
+    fake = FakeOpenAI(latency=0, bitrate=64000)
+
+    for segment, start, end in processor.split_audio_streaming(source):
+        try:
+            with segment.open() as audio_file:
+                transcript = fake.audio.transcriptions.create(file=audio_file, model='whisper-1')
+            probed = float(ffmpeg.probe(segment.path)['format']['duration'])
+            assert transcript.duration == pytest.approx(probed, abs=0.1)
+            assert transcript.segments[-1].end == transcript.duration
+        finally:
+            segment.release()
@@ -0,0 +1,45 @@
+import json
+import pytest
+from transcript_segments import SegmentTimeline
+
+
+@pytest.fixture
+def post_id(backend):
+    timeline = SegmentTimeline()
+    timeline.extend([(0.0, 5.0, 'hello big world'), (5.0, 10.0, 'and the second part.')])
+    return backend.post_store.create_post('Transcript: talk.mp3', 'audio_transcript', timeline.text, timeline=timeline)
+
+
+def test_edit_from_editor_text_patches_timeline(backend, post_id, monkeypatch):
+    edits = {'edits': [{'passage': 0, 'find': 'big', 'replace': 'small'}]}
+    monkeypatch.setattr(backend, 'chat_completion', lambda **params: json.dumps(edits))
+    editor_text = ' ' + backend.post_store.get_post(post_id)['content'].replace(' world ', ' world\n ') + ' '
+
+    # The editor posts textContent, which picks up spaces and newlines from its word spans
+    response = backend.app.test_client().post(f'/chat/{post_id}/edit', json={
+        'message': 'change "big" to small',
+        'blogContent': editor_text,
+    })
+
+    assert response.status_code == 200
+    patch, = response.get_json()['patches']
+    assert (patch['audio_start'], patch['audio_end']) == (0.0, 5.0)
+    assert backend.post_store.get_timeline(post_id).text == 'hello small world and the second part.'
+
+    segments = backend.app.test_client().get(f'/transcript/{post_id}/segments').get_json()
+    assert segments['in_sync']
+    assert segments['segments'][0]['text'] == 'hello small world'
+
+
+def test_edit_of_rewritten_transcript_leaves_timeline_alone(backend, post_id, monkeypatch):
+    edits = {'edits': [{'passage': 0, 'find': 'big', 'replace': 'small'}]}
+    monkeypatch.setattr(backend, 'chat_completion', lambda **params: json.dumps(edits))
+
+    response = backend.app.test_client().post(f'/chat/{post_id}/edit', json={
+        'message': 'change "big" to small',
+        'blogContent': 'A big rewrite that no longer matches the audio.',
+    })
+
+    assert response.status_code == 200
+    assert 'audio_start' not in response.get_json()['patches'][0]
+    assert backend.post_store.get_timeline(post_id).text == 'hello big world and the second part.'
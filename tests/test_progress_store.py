@@ -0,0 +1,54 @@
+import shutil
+import pytest
+import ffmpeg
+from progress_store import MemoryProgressStore, SQLiteProgressStore
+
+needs_ffmpeg = pytest.mark.skipif(not (shutil.which('ffmpeg') and shutil.which('ffprobe')),
+                                  reason='ffmpeg and ffprobe are not installed')
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryProgressStore()
+    return SQLiteProgressStore(str(tmp_path / 'progress.db'), poll_interval=0.01)
+
+
+def test_clear_segments_restarts_the_log(store):
+    store.set('s', {'status': 'Processing...'})
+    store.append_segment('s', {'start': 0, 'end': 5, 'text': 'first run'})
+    version, _, _ = store.wait('s', -1, timeout=0)
+
+    store.clear_segments('s')
+    store.append_segment('s', {'start': 0, 'end': 5, 'text': 'second run'})
+
+    new_version, _, segments = store.wait('s', version, timeout=0)
+    assert new_version != version
+    assert segments == [{'start': 0, 'end': 5, 'text': 'second run'}]
+
+
+@needs_ffmpeg
+def test_resumed_job_publishes_each_segment_once(backend, tmp_path, monkeypatch):
+    source = str(tmp_path / 'talk.wav')
+    ffmpeg.run(ffmpeg.output(ffmpeg.input('anoisesrc=color=pink:duration=40', f='lavfi'), source, loglevel='error'))
+    monkeypatch.setattr(backend.audio_processor, 'OPTIMAL_DURATION', 10)
+    monkeypatch.setattr(backend.audio_processor, 'FALLBACK_DURATION', 10)
+
+    transcribe = backend.transcribe_segment_cached
+    calls = []
+
+    def fail_third(segment):
+        calls.append(segment)
+        if len(calls) == 3:
+            raise RuntimeError('upstream down')
+        return transcribe(segment)
+
+    monkeypatch.setattr(backend, 'transcribe_segment_cached', fail_third)
+    with pytest.raises(RuntimeError):
+        backend.process_audio_file(source, 'resume-session', workers=1)
+    backend.process_audio_file(source, 'resume-session', workers=1)
+
+    _, _, segments = backend.audio_processor.wait_for_progress('resume-session', -1, timeout=0)
+    starts = [segment['start'] for segment in segments]
+    assert len(starts) == len(set(starts))
+    assert len(starts) == len(calls) - 1  # Every chunk that was transcribed, the failed one excepted
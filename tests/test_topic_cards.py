@@ -0,0 +1,132 @@
+import pytest
+
+
+def make_cards(count):
+    return [{'title': f"Topic {i}: Title {i}", 'content': f"content {i}"} for i in range(1, count + 1)]
+
+
+@pytest.fixture
+def post_id(backend):
+    post_id = backend.post_store.create_post('Transcript: talk.mp3', 'audio_transcript', 'hello world')
+    backend.post_store.set_topic_cards(post_id, make_cards(3))
+    return post_id
+
+
+@pytest.mark.parametrize('route, body', [
+    ('/merge-topics/{}', {'cardIndex': 2}),
+    ('/exclude-topic/{}', {'cardIndex': 7}),
+    ('/split-topic/{}', {'cardIndex': -1, 'content': 'x'}),
+    ('/topic-cards/{}/batch', {'operations': [{'op': 'exclude', 'cardIndex': 7}]}),
+])
+def test_bad_card_index_is_a_client_error_on_every_route(backend, post_id, route, body):
+    response = backend.app.test_client().post(route.format(post_id), json=body)
+    assert response.status_code == 400
+    assert backend.post_store.get_topic_cards(post_id) == make_cards(3)
+
+
+@pytest.mark.parametrize('route, body', [
+    ('/merge-topics/{}', {'cardIndex': 0}),
+    ('/exclude-topic/{}', {'cardIndex': 0}),
+    ('/split-topic/{}', {'cardIndex': 0, 'content': 'x'}),
+    ('/topic-cards/{}/batch', {'operations': [{'op': 'exclude', 'cardIndex': 0}]}),
+])
+def test_missing_cards_are_not_found_on_every_route(backend, route, body):
+    post_id = backend.post_store.create_post('Transcript: talk.mp3', 'audio_transcript', 'hello world')
+    response = backend.app.test_client().post(route.format(post_id), json=body)
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('route', ['/chat/{}', '/chat/{}/stream', '/chat/{}/edit'])
+def test_chat_routes_answer_alike(backend, post_id, route):
+    client = backend.app.test_client()
+    assert client.post(route.format(post_id + 1000), json={'message': 'hi'}).status_code == 404
+    response = client.post(route.format(post_id), json={'blogContent': 'hello world'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'No message provided'}
+
+
+def test_merge_and_exclude_renumber(backend, post_id):
+    client = backend.app.test_client()
+    assert client.post(f'/merge-topics/{post_id}', json={'cardIndex': 0, 'mergedContent': 'both'}).status_code == 200
+    assert client.post(f'/exclude-topic/{post_id}', json={'cardIndex': 0}).status_code == 200
+    assert backend.post_store.get_topic_cards(post_id) == [{'title': 'Topic 1: Title 3', 'content': 'content 3'}]
+
+
+SPLIT_RESPONSE = "Topic 1: A\nalpha\n\nTopic 2: B\nbeta"
+
+# Listed low index first, so each operation would shift the cards of the ones after it if applied in order
+MIXED_BATCH = [
+    {'op': 'refine', 'cardIndex': 0, 'instruction': 'shorter'},
+    {'op': 'split', 'cardIndex': 1},
+    {'op': 'merge', 'cardIndex': 2},
+    {'op': 'exclude', 'cardIndex': 4},
+]
+
+MIXED_RESULT = [
+    {'title': 'Topic 1: Title 1', 'content': 'refined'},
+    {'title': 'Topic 2: A', 'content': 'alpha'},
+    {'title': 'Topic 3: B', 'content': 'beta'},
+    {'title': 'Topic 4: Merged Topics', 'content': 'content 3\n\ncontent 4'},
+]
+
+
+def fake_chat_completion(backend, calls):
+    def chat_completion(**params):
+        calls.append(params)
+        return SPLIT_RESPONSE if params['messages'][0]['content'] == backend.SPLIT_TOPIC_PROMPT else 'refined\n'
+    return chat_completion
+
+
+def test_apply_card_operations_uses_original_indices(backend):
+    cards = make_cards(5)
+    operations = backend.parse_card_operations(MIXED_BATCH, cards)
+    backend.apply_card_operations(cards, operations, {0: 'refined', 1: [' A\nalpha\n\n', ' B\nbeta']})
+    assert cards == MIXED_RESULT
+
+
+def test_batch_applies_mixed_operations(backend, monkeypatch):
+    post_id = backend.post_store.create_post('Transcript: talk.mp3', 'audio_transcript', 'hello world')
+    backend.post_store.set_topic_cards(post_id, make_cards(5))
+    calls = []
+    monkeypatch.setattr(backend, 'chat_completion', fake_chat_completion(backend, calls))
+
+    response = backend.app.test_client().post(f'/topic-cards/{post_id}/batch', json={'operations': MIXED_BATCH})
+
+    assert response.status_code == 200
+    assert response.get_json()['cards'] == MIXED_RESULT
+    assert backend.post_store.get_topic_cards(post_id) == MIXED_RESULT
+    assert len(calls) == 2  # Merge and exclude need no model call
+
+
+@pytest.mark.parametrize('operations', [
+    [{'op': 'merge', 'cardIndex': 1}, {'op': 'exclude', 'cardIndex': 2}],
+    [{'op': 'split', 'cardIndex': 0}, {'op': 'refine', 'cardIndex': 0, 'instruction': 'shorter'}],
+    [{'op': 'merge', 'cardIndex': 0}, {'op': 'merge', 'cardIndex': 1}],
+])
+def test_batch_rejects_operations_on_the_same_card(backend, post_id, monkeypatch, operations):
+    calls = []
+    monkeypatch.setattr(backend, 'chat_completion', fake_chat_completion(backend, calls))
+
+    response = backend.app.test_client().post(f'/topic-cards/{post_id}/batch', json={'operations': operations})
+
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Operation 1:')
+    assert not calls
+    assert backend.post_store.get_topic_cards(post_id) == make_cards(3)
+
+
+def test_batch_applies_nothing_when_an_operation_fails(backend, post_id, monkeypatch):
+    def chat_completion(**params):
+        if params['messages'][0]['content'] == backend.REFINE_CARD_PROMPT:
+            raise RuntimeError('Upstream timed out')
+        return SPLIT_RESPONSE
+    monkeypatch.setattr(backend, 'chat_completion', chat_completion)
+
+    response = backend.app.test_client().post(f'/topic-cards/{post_id}/batch', json={'operations': [
+        {'op': 'split', 'cardIndex': 0},
+        {'op': 'refine', 'cardIndex': 2, 'instruction': 'shorter'},
+    ]})
+
+    assert response.status_code == 500
+    assert response.get_json()['failures'] == [{'operation': 1, 'error': 'Upstream timed out'}]
+    assert backend.post_store.get_topic_cards(post_id) == make_cards(3)
@@ -0,0 +1,70 @@
+import json
+import pytest
+from transcript_patch import split_passages, resolve_patch, apply_patch
+
+
+def assert_contiguous(text, passages):
+    """Passages cover each paragraph end to end, in order, and never start or end on a paragraph gap"""
+    for (_, end), (start, _) in zip(passages, passages[1:]):
+        assert start == end or text[end:start].strip() == ''
+    assert text[:passages[0][0]].strip() == '' and text[passages[-1][1]:].strip() == ''
+
+
+def test_unpunctuated_text_is_cut_at_word_boundaries():
+    text = ' '.join(f"word{i}" for i in range(400))
+    passages = split_passages(text, target_chars=100)
+
+    assert_contiguous(text, passages)
+    assert passages[0][0] == 0 and passages[-1][1] == len(text)
+    assert all(end - start <= 200 for start, end in passages)
+    for start, end in passages[:-1]:
+        assert text[end - 1] == ' '  # Cut after the space, so no word is split
+        assert end - start <= 100
+
+
+def test_single_oversized_word_is_cut_mid_word():
+    text = 'before ' + 'x' * 450 + ' after'
+    passages = split_passages(text, target_chars=100)
+
+    assert_contiguous(text, passages)
+    assert ''.join(text[start:end] for start, end in passages) == text
+    assert all(end - start <= 200 for start, end in passages)
+    assert (0, 7) in passages  # The word before it still ends at its space
+
+
+def test_paragraph_breaks_end_passages():
+    text = '\n  First paragraph. Still first.\n\n\nSecond one!  \n'
+    passages = split_passages(text)
+
+    assert [text[start:end] for start, end in passages] == ['First paragraph. Still first.', 'Second one!']
+
+
+def test_sentences_are_grouped_up_to_the_target():
+    sentence = 'Each of these sentences is forty chars. '
+    text = sentence * 10
+    passages = split_passages(text, target_chars=100)
+
+    assert_contiguous(text, passages)
+    assert all(text[start:end].endswith('. ') or end == len(text.rstrip()) for start, end in passages)
+    assert all(100 <= end - start < 140 for start, end in passages[:-1])
+
+
+@pytest.mark.parametrize('target_chars', [30, 60, 600])
+def test_patch_offsets_land_in_the_edited_passage(target_chars):
+    # The same word appears in several passages, so only the passage offsets say which one is meant
+    text = ('The marker starts here. ' * 3 + '\n\n' + 'raw asr text with the marker and no punctuation ' * 4
+            + '\n\nLast marker.')
+    passages = split_passages(text, target_chars=target_chars)
+    assert_contiguous(text, passages)
+
+    for index, (start, end) in enumerate(passages):
+        if 'marker' not in text[start:end]:
+            continue
+        edits = json.dumps({'edits': [{'passage': index, 'find': 'marker', 'replace': 'MARKER'}]})
+        patch, = resolve_patch(text, passages, [index], edits)
+
+        assert patch['start'] == text.index('marker', start)
+        assert start <= patch['start'] and patch['end'] <= end
+        patched = apply_patch(text, [patch])
+        assert patched.count('MARKER') == 1
+        assert patched[patch['start']:patch['start'] + 6] == 'MARKER'
@@ -0,0 +1,64 @@
+import io
+import pytest
+from upload_spool import UploadSpool
+from job_checkpoints import CheckpointStore
+from job_scheduler import QueueFullError
+from transcript_segments import SegmentTimeline
+
+
+@pytest.fixture
+def spool(backend, tmp_path, monkeypatch):
+    spool = UploadSpool(str(tmp_path), 1024 * 1024)
+    monkeypatch.setattr(spool, '_probe_header', lambda upload_id, upload: None)
+    monkeypatch.setattr(backend, 'upload_spool', spool)
+    return spool
+
+
+def upload(backend, session_id, data=b'x' * 100):
+    client = backend.app.test_client()
+    upload_id = client.post('/upload-audio/start', json={'filename': 'talk.mp3', 'size': len(data),
+                                                         'session_id': session_id}).get_json()['upload_id']
+    return client.put(f'/upload-audio/{upload_id}?offset=0', data=io.BytesIO(data))
+
+
+def run_now(session_id, target):
+    try:
+        target()
+    except Exception:
+        pass
+
+
+def test_rejected_job_deletes_its_upload(backend, spool, tmp_path, monkeypatch):
+    def full(session_id, target):
+        raise QueueFullError('Job queue is full')
+    monkeypatch.setattr(backend.job_scheduler, 'submit', full)
+
+    assert upload(backend, 'rejected').status_code == 503
+    assert not list(tmp_path.iterdir())
+
+
+def test_finished_job_deletes_its_upload(backend, spool, tmp_path, monkeypatch):
+    timeline = SegmentTimeline()
+    timeline.extend([(0.0, 5.0, 'hello world')])
+    monkeypatch.setattr(backend.job_scheduler, 'submit', run_now)
+    monkeypatch.setattr(backend, 'process_audio_file', lambda file_path, session_id, filename=None: timeline)
+
+    assert upload(backend, 'finished').status_code == 200
+    assert backend.audio_processor.get_progress('finished')['status'] == 'complete'
+    assert not list(tmp_path.iterdir())
+
+
+def test_failed_job_keeps_its_upload_until_pruned(backend, spool, tmp_path, monkeypatch):
+    def fail(file_path, session_id, filename=None):
+        backend.checkpoints.start_job(session_id, 'hash', file_path, filename)
+        raise RuntimeError('Transcription failed')
+    monkeypatch.setattr(backend.job_scheduler, 'submit', run_now)
+    monkeypatch.setattr(backend, 'process_audio_file', fail)
+
+    assert upload(backend, 'failed').status_code == 200
+    file_path, = tmp_path.iterdir()
+    assert backend.checkpoints.get_job('failed')['file_path'] == str(file_path)
+
+    expired = CheckpointStore(backend.CHECKPOINT_DB_PATH, max_age=-1)
+    expired.prune()
+    assert not file_path.exists()
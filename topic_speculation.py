@@ -0,0 +1,64 @@
+import re
+import html
+import hashlib
+import logging
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
+def normalize_transcript(content):
+    """Plain text of a transcript, whether it came from Whisper or the editor's word-span HTML"""
+    text = html.unescape(re.sub(r'<[^>]+>', ' ', content))
+    return ' '.join(text.split())
+
+def transcript_hash(content):
+    return hashlib.sha256(normalize_transcript(content).encode()).hexdigest()
+
+class TopicSpeculator:
+    """Generates topic cards in the background as soon as a transcript is ready.
+
+    Results are stored by transcript hash and granularity, so they are only
+    used if the user saves the transcript unchanged. ``get`` waits for a
+    generation that is still running instead of starting a duplicate.
+    """
+
+    def __init__(self, generate, post_store, granularities=(3,), workers=2, max_age=24*3600):
+        self.generate = generate
+        self.post_store = post_store
+        self.granularities = granularities
+        self.max_age = max_age
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='speculate')
+        self.in_flight = {}
+        self.lock = Lock()
+
+    def schedule(self, transcript):
+        """Start generating cards for every configured granularity"""
+        text = normalize_transcript(transcript)
+        content_hash = transcript_hash(text)
+        for granularity in self.granularities:
+            key = (content_hash, granularity)
+            with self.lock:
+                if key in self.in_flight:
+                    continue
+                self.in_flight[key] = self.executor.submit(self._run, key, text, granularity)
+
+    def _run(self, key, text, granularity):
+        try:
+            if self.post_store.get_precomputed_cards(*key) is None:
+                cards = self.generate(text, granularity)
+                self.post_store.put_precomputed_cards(key[0], granularity, cards)
+                logging.info(f"Precomputed {granularity} topic cards for transcript {key[0][:12]}")
+            self.post_store.prune_precomputed_cards(self.max_age)
+        except Exception as e:
+            logging.warning(f"Speculative topic generation failed: {str(e)}")
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    def get(self, transcript, granularity):
+        """Precomputed cards for this exact transcript, or None if it changed or was never scheduled"""
+        key = (transcript_hash(transcript), granularity)
+        with self.lock:
+            future = self.in_flight.get(key)
+        if future is not None:
+            future.result()
+        return self.post_store.get_precomputed_cards(*key)
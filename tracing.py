@@ -0,0 +1,115 @@
+import time
+import logging
+from collections import OrderedDict
+from contextvars import ContextVar
+from threading import Lock
+from metrics import LatencyHistogram
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+
+current_session = ContextVar('current_session', default=None)
+trace_log = logging.getLogger('trace')
+
+class Tracer:
+    """Per-stage latency histograms plus a timing breakdown for each recent session.
+
+    Spans are tagged with a session ID, either passed explicitly or taken from
+    the ``bind`` context of the current thread. Only the last ``max_sessions``
+    sessions keep a breakdown.
+    """
+
+    def __init__(self, max_sessions=1000):
+        self.max_sessions = max_sessions
+        self.histograms = {}
+        self.sessions = OrderedDict()
+        self.lock = Lock()
+
+    def record(self, stage, seconds, session_id=None):
+        session_id = session_id or current_session.get()
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram(STAGE_BUCKETS)
+            if session_id is not None:
+                stages = self.sessions.get(session_id)
+                if stages is None:
+                    stages = self.sessions[session_id] = {}
+                    while len(self.sessions) > self.max_sessions:
+                        self.sessions.popitem(last=False)
+                count, total, longest = stages.get(stage, (0, 0.0, 0.0))
+                stages[stage] = (count + 1, total + seconds, max(longest, seconds))
+        histogram.observe(seconds)
+        trace_log.debug(f"stage={stage} session={session_id} seconds={seconds:.4f}")
+
+    def span(self, stage, session_id=None):
+        """Context manager timing one occurrence of ``stage``"""
+        return _Span(self, stage, session_id)
+
+    def breakdown(self, session_id):
+        """{stage: {'count', 'total_seconds', 'max_seconds'}} for a session, or None"""
+        with self.lock:
+            stages = self.sessions.get(session_id)
+            if stages is None:
+                return None
+            return {stage: {'count': count, 'total_seconds': round(total, 4), 'max_seconds': round(longest, 4)}
+                    for stage, (count, total, longest) in stages.items()}
+
+    def snapshots(self):
+        with self.lock:
+            histograms = dict(self.histograms)
+        return {stage: h.snapshot() for stage, h in histograms.items()}
+
+class _Span:
+    __slots__ = ('tracer', 'stage', 'session_id', 'start')
+
+    def __init__(self, tracer, stage, session_id):
+        self.tracer = tracer
+        self.stage = stage
+        self.session_id = session_id
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.stage, time.perf_counter() - self.start, self.session_id)
+        return False
+
+class bind:
+    """Tag spans recorded in this context (e.g. a job's thread) with ``session_id``"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+
+    def __enter__(self):
+        self.token = current_session.set(self.session_id)
+
+    def __exit__(self, *exc_info):
+        current_session.reset(self.token)
+        return False
+
+tracer = Tracer()
+span = tracer.span
+record = tracer.record
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+def prometheus_histograms(name, help_text, label, snapshots):
+    """Exposition lines for LatencyHistogram snapshots keyed by the value of ``label``"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for value, snapshot in sorted(snapshots.items()):
+        for bound, count in snapshot['buckets'].items():
+            lines.append(f"{name}_bucket{_labels({label: value, 'le': bound})} {count}")
+        lines.append(f"{name}_sum{_labels({label: value})} {snapshot['sum']}")
+        lines.append(f"{name}_count{_labels({label: value})} {snapshot['count']}")
+    return lines
+
+def prometheus_samples(name, help_text, metric_type, samples):
+    """Exposition lines for a counter or gauge; ``samples`` is [(labels, value)]"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+    return lines
@@ -0,0 +1,75 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import whisper_worker
+
+class APITranscriber:
+    """Hosted Whisper via the (wrapped) OpenAI client"""
+
+    def __init__(self, client, model='whisper-1'):
+        self.client = client
+        self.model = model
+        self.name = model
+
+    def transcribe(self, segment):
+        """Whisper's (start, end, text) segments for an AudioSegment, timed from its start"""
+        with segment.open() as audio_file:
+            transcript = self.client.audio.transcriptions.create(
+                file=audio_file,
+                model=self.model,
+                response_format="verbose_json",
+                timestamp_granularities=["segment"]
+            )
+        return [(s.start, s.end, s.text) for s in transcript.segments or []]
+
+def available_cores():
+    """CPU cores this process may run on (respects container CPU affinity)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+class LocalWhisperTranscriber:
+    """faster-whisper on the CPU, one model per worker process.
+
+    ``workers`` defaults to the available cores divided by ``cpu_threads``, so
+    throughput scales with the cores given to the container. Segments are sent
+    to workers as bytes (or as a path if they were spilled to disk).
+
+    Workers are spawned rather than forked: the server already runs threads
+    holding locks and SQLite connections, which a forked child would inherit
+    in whatever state they were in. What they run lives in whisper_worker, so
+    a worker imports nothing of the server's.
+    """
+
+    def __init__(self, model_size='base', compute_type='int8', cpu_threads=2, workers=None, beam_size=5):
+        try:
+            import faster_whisper  # noqa: F401  Fail at startup rather than on the first job
+        except ImportError:
+            raise RuntimeError("The local transcription backend needs faster-whisper: pip install faster-whisper")
+
+        self.workers = workers or max(1, available_cores() // cpu_threads)
+        self.name = f"faster-whisper-{model_size}-{compute_type}"
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=whisper_worker.load_model,
+            initargs=(model_size, compute_type, cpu_threads, beam_size)
+        )
+        logging.info(f"Local Whisper: {self.name} on {self.workers} worker processes x {cpu_threads} threads")
+
+    def transcribe(self, segment):
+        """Whisper's (start, end, text) segments for an AudioSegment, timed from its start"""
+        audio = bytes(segment.data) if segment.data is not None else segment.path
+        return self.executor.submit(whisper_worker.transcribe, audio).result()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+def create_transcriber(backend='openai', client=None, **kwargs):
+    """Build the configured transcription backend ('openai' or 'local')"""
+    if backend == 'openai':
+        return APITranscriber(client, **kwargs)
+    if backend == 'local':
+        return LocalWhisperTranscriber(**kwargs)
+    raise ValueError(f"Unknown transcription backend: {backend}")
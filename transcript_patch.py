@@ -0,0 +1,169 @@
+import re
+import html
+import json
+from bisect import bisect_left
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'can', 'change', 'could', 'fix', 'for', 'from',
+    'in', 'into', 'is', 'it', 'its', 'make', 'me', 'of', 'on', 'or', 'please', 'replace', 'should', 'that',
+    'the', 'this', 'to', 'was', 'where', 'which', 'with', 'word', 'would', 'you'
+}
+
+PATCH_SYSTEM_PROMPT = """You are a helpful transcript editor. Your task is to help users fix any inaccuracies in transcripts while preserving the original meaning and style.
+
+You will be shown numbered passages from a longer transcript, e.g. [P3] followed by its text. Only edit what the user asks for.
+
+Respond with JSON only, in this shape:
+{"edits": [{"passage": 3, "find": "exact text copied from that passage", "replace": "corrected text"}]}
+
+Rules:
+1. "find" must be copied exactly (same case and punctuation) from the passage it names, and should be as short as possible while still unique within that passage
+2. Use one edit per separate change
+3. If nothing needs to change, return {"edits": []}"""
+
+class PatchError(Exception):
+    """The model's patch could not be applied to the transcript"""
+
+def split_passages(text, target_chars=600, max_chars=None):
+    """Split text into (start, end) character ranges of roughly ``target_chars``.
+
+    Paragraph breaks always end a passage; within a paragraph, passages end on
+    sentence boundaries once they reach the target size. Text without usable
+    punctuation (raw ASR output often has none) is cut at word boundaries so no
+    passage exceeds ``max_chars`` (default twice the target).
+    """
+    max_chars = max_chars or 2 * target_chars
+    passages = []
+    for paragraph in re.finditer(r'\S(?:.*?\S)?(?=\s*\n\s*\n|\s*$)', text, re.S):
+        start = paragraph.start()
+        for sentence in re.finditer(r'[.!?]["\')\]]*\s+', paragraph.group()):
+            end = paragraph.start() + sentence.end()
+            if end - start >= target_chars:
+                passages.extend(_split_long(text, start, end, target_chars, max_chars))
+                start = end
+        if start < paragraph.end():
+            passages.extend(_split_long(text, start, paragraph.end(), target_chars, max_chars))
+    return passages
+
+def _split_long(text, start, end, target_chars, max_chars):
+    """text[start:end] as one range, or if it's over max_chars, ranges of about target_chars cut after whitespace"""
+    ranges = []
+    while end - start > max_chars:
+        limit = start + target_chars
+        cut = max(text.rfind(' ', start + 1, limit), text.rfind('\n', start + 1, limit))
+        # A single word longer than target_chars is cut mid-word
+        cut = cut + 1 if cut != -1 else limit
+        ranges.append((start, cut))
+        start = cut
+    ranges.append((start, end))
+    return ranges
+
+def _terms(message):
+    quoted = re.findall(r'["“\'‘]([^"”\'’]{2,})["”\'’]', message)
+    words = [w for w in re.findall(r"[\w']+", message.lower()) if w not in STOPWORDS and len(w) > 2]
+    return [q.lower() for q in quoted], words
+
+def select_window(text, passages, message, selected_text=None, radius=1, max_passages=6):
+    """Indices of the passages to send to the model, or [] if nothing relevant was found.
+
+    Uses the user's selected text if given, otherwise scores passages by the
+    quoted phrases and keywords in the request. Neighbouring passages within
+    ``radius`` are included for context.
+    """
+    lowered = [text[start:end].lower() for start, end in passages]
+    
+    if selected_text and selected_text.strip():
+        needle = ' '.join(selected_text.lower().split())
+        position = ' '.join(text.lower().split()).find(needle)
+        hits = []
+        if position != -1:
+            # Map the whitespace-normalized match back onto passages
+            normalized_offset = 0
+            for i, passage in enumerate(lowered):
+                length = len(' '.join(passage.split())) + 1
+                if normalized_offset < position + len(needle) and position < normalized_offset + length:
+                    hits.append(i)
+                normalized_offset += length
+    else:
+        quoted, words = _terms(message)
+        scores = [sum(5 for q in quoted if q in p) + sum(1 for w in words if re.search(rf'\b{re.escape(w)}\b', p))
+                  for p in lowered]
+        best = max(scores, default=0)
+        hits = [i for i, score in enumerate(scores) if best and score == best]
+    
+    if not hits:
+        return []
+    
+    window = set()
+    for i in hits:
+        window.update(range(max(0, i - radius), min(len(passages), i + radius + 1)))
+    return sorted(window)[:max_passages]
+
+def window_prompt(text, passages, window, message):
+    numbered = '\n\n'.join(f"[P{i}] {text[passages[i][0]:passages[i][1]]}" for i in window)
+    return f"Passages:\n\n{numbered}\n\nUser request: {message}"
+
+def resolve_patch(text, passages, window, response_text):
+    """Turn the model's JSON edits into absolute (start, end, replacement) ranges"""
+    try:
+        edits = json.loads(response_text).get('edits', [])
+    except (ValueError, AttributeError) as e:
+        raise PatchError(f"Model returned invalid JSON: {e}")
+    
+    ranges = []
+    for edit in edits:
+        passage = edit.get('passage')
+        find = edit.get('find') or ''
+        if passage not in window or not find:
+            raise PatchError(f"Edit refers to a passage that wasn't provided: {edit}")
+        
+        start, end = passages[passage]
+        offset = text.find(find, start, end)
+        if offset == -1:
+            raise PatchError(f"Text to replace not found in passage {passage}: {find!r}")
+        ranges.append({'start': offset, 'end': offset + len(find), 'replacement': edit.get('replace', '')})
+    
+    ranges.sort(key=lambda r: r['start'])
+    for previous, current in zip(ranges, ranges[1:]):
+        if current['start'] < previous['end']:
+            raise PatchError("Model returned overlapping edits")
+    return ranges
+
+# Tags, character references (the same pattern html.unescape uses), whitespace runs, single characters
+NORMALIZE_TOKENS = re.compile(r'<[^>]+>|&(?:#[0-9]+;?|#[xX][0-9a-fA-F]+;?|[^\t\n\f <&#;]{1,32};?)|\s+|.', re.S)
+
+def normalize_with_offsets(content):
+    """``normalize_transcript(content)`` plus, for each of its characters, the offset it came from.
+
+    The offsets list has one extra entry, ``len(content)``, so range ends map too.
+    Tags and runs of whitespace collapse to single spaces and entities are unescaped,
+    exactly as normalize_transcript does.
+    """
+    chars, offsets, space_at = [], [], None
+    for token in NORMALIZE_TOKENS.finditer(content):
+        raw = token.group()
+        piece = html.unescape(raw) if raw[0] == '&' else raw
+        for char in piece:
+            if (raw[0] == '<' and len(raw) > 1) or char.isspace():
+                if space_at is None:
+                    space_at = token.start()
+                continue
+            if space_at is not None and chars:
+                chars.append(' ')
+                offsets.append(space_at)
+            space_at = None
+            chars.append(char)
+            offsets.append(token.start())
+    offsets.append(len(content))
+    return ''.join(chars), offsets
+
+def normalize_ranges(offsets, ranges):
+    """Map (start, end, replacement) edits of the raw content onto its normalized text"""
+    return [{'start': bisect_left(offsets, r['start']), 'end': bisect_left(offsets, r['end']),
+             'replacement': ' '.join(r['replacement'].split())} for r in ranges]
+
+def apply_patch(text, ranges):
+    """Apply non-overlapping (start, end, replacement) ranges to text"""
+    for r in sorted(ranges, key=lambda r: r['start'], reverse=True):
+        text = text[:r['start']] + r['replacement'] + text[r['end']:]
+    return text
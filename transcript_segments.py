@@ -0,0 +1,117 @@
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+
+class SegmentTimeline:
+    """Timestamped transcript segments in time order, stored column-wise.
+
+    Start/end times and the character offset of each segment within ``text``
+    (segments joined by single spaces) live in flat arrays, so a long recording's
+    timeline stays small and lookups by time or by character are a bisect.
+    """
+
+    def __init__(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self.offsets = array('q')  # Where each segment's text begins in self.text
+        self.texts = []
+        self.length = 0
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends, self.texts)
+
+    def append(self, start, end, text):
+        text = ' '.join(text.split())
+        if not text:
+            return
+        if self.texts:
+            self.length += 1  # Joining space
+        self.starts.append(start)
+        self.ends.append(end)
+        self.offsets.append(self.length)
+        self.texts.append(text)
+        self.length += len(text)
+
+    def extend(self, segments, offset=0.0):
+        """Add (start, end, text) segments whose times are relative to ``offset``"""
+        for start, end, text in segments:
+            self.append(offset + start, offset + end, text)
+
+    @property
+    def text(self):
+        return ' '.join(self.texts)
+
+    @property
+    def duration(self):
+        return self.ends[-1] if self.texts else 0.0
+
+    def index_at_time(self, seconds):
+        """Index of the segment playing at ``seconds`` (or the last one starting before it)"""
+        return max(0, bisect_right(self.starts, seconds) - 1)
+
+    def index_at_char(self, offset):
+        """Index of the segment containing character ``offset`` of ``text``"""
+        return max(0, bisect_right(self.offsets, offset) - 1)
+
+    def time_range(self, start, end):
+        """(first, last) indices of segments overlapping [start, end) seconds, or None"""
+        first = bisect_right(self.ends, start)
+        last = bisect_left(self.starts, end) - 1
+        return (first, last) if first <= last else None
+
+    def char_span(self, first, last):
+        """(start, end) character range of segments ``first``..``last`` within ``text``"""
+        return self.offsets[first], self.offsets[last] + len(self.texts[last])
+
+    def time_span(self, char_start, char_end):
+        """(start, end) seconds covered by a character range of ``text``"""
+        first = self.index_at_char(char_start)
+        last = self.index_at_char(max(char_start, char_end - 1))
+        return self.starts[first], self.ends[last]
+
+    def segments(self, first=0, last=None):
+        """Segments ``first``..``last`` as dicts with their character offsets"""
+        last = len(self) - 1 if last is None else last
+        return [{'index': i, 'start': self.starts[i], 'end': self.ends[i], 'text': self.texts[i],
+                 'char_start': self.offsets[i], 'char_end': self.offsets[i] + len(self.texts[i])}
+                for i in range(first, last + 1)]
+
+    def apply_patch(self, ranges):
+        """Apply (start, end, replacement) character edits of ``text`` to the segments.
+
+        An edit spanning several segments folds them into one segment covering
+        their combined time. Returns the patched timeline.
+        """
+        texts, ends = list(self.texts), list(self.ends)
+        for r in sorted(ranges, key=lambda r: r['start'], reverse=True):
+            first = self.index_at_char(r['start'])
+            last = self.index_at_char(max(r['start'], r['end'] - 1))
+            joined = ' '.join(texts[first:last + 1])
+            base = self.offsets[first]
+            texts[first] = joined[:r['start'] - base] + r['replacement'] + joined[r['end'] - base:]
+            ends[first] = ends[last]
+            for i in range(first + 1, last + 1):
+                texts[i] = ''
+
+        patched = SegmentTimeline()
+        for start, end, text in zip(self.starts, ends, texts):
+            patched.append(start, end, text)
+        return patched
+
+    def to_json(self):
+        return json.dumps({
+            'starts': [round(t, 3) for t in self.starts],
+            'ends': [round(t, 3) for t in self.ends],
+            'texts': self.texts
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        timeline = cls()
+        for start, end, text in zip(data['starts'], data['ends'], data['texts']):
+            timeline.append(start, end, text)
+        return timeline
@@ -0,0 +1,37 @@
+import hashlib
+from disk_cache import DiskCache
+from transcript_segments import SegmentTimeline
+
+def hash_file(file_path, block_size=1024*1024):
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TranscriptionCache(DiskCache):
+    """Persistent content-addressed transcription store with a size cap and LRU eviction.
+
+    Whole uploads are keyed by ``file:<sha256>`` and individual encoded segments by
+    ``segment:<sha256>``; values are JSON. A segment's value is its list of
+    [start, end, text] Whisper segments, relative to the start of the segment.
+    """
+
+    def __init__(self, db_path, max_bytes=256*1024*1024):
+        super().__init__(db_path, max_bytes=max_bytes, table='transcriptions')
+
+    def get_file(self, file_hash):
+        """SegmentTimeline for a whole upload, or None"""
+        cached = self.get(f"file:{file_hash}")
+        return SegmentTimeline.from_json(cached) if cached is not None else None
+
+    def put_file(self, file_hash, timeline):
+        self.put(f"file:{file_hash}", timeline.to_json())
+
+    def get_segment(self, segment_hash):
+        """Whisper segments for an encoded segment, or None"""
+        return self.get(f"segment:{segment_hash}")
+
+    def put_segment(self, segment_hash, segments):
+        self.put(f"segment:{segment_hash}", [list(s) for s in segments])
@@ -0,0 +1,142 @@
+import os
+import time
+import uuid
+import logging
+import ffmpeg
+from threading import Lock
+
+class UploadError(Exception):
+    """Upload rejected; status_code is the HTTP status to report"""
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class UploadSpool:
+    """Resumable chunked uploads streamed straight to uniquely named spool files.
+
+    Each chunk is copied from the request stream in small blocks, so neither the
+    whole file nor a whole chunk is held in memory, and the size limit is checked
+    as bytes arrive rather than after the file has been written. Uploads with no
+    chunk for ``ttl`` seconds are dropped along with their spool files.
+    """
+
+    def __init__(self, upload_folder, max_upload_size, block_size=64*1024, header_probe_bytes=256*1024,
+                 ttl=24*3600, sweep_interval=60):
+        self.upload_folder = upload_folder
+        self.max_upload_size = max_upload_size
+        self.block_size = block_size
+        self.header_probe_bytes = header_probe_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.last_sweep = time.monotonic()
+        self.uploads = {}
+        self.lock = Lock()
+
+    def create(self, filename, size, session_id):
+        """Register a new upload and return its ID"""
+        if size <= 0:
+            raise UploadError('Invalid file size')
+        if size > self.max_upload_size:
+            raise UploadError(f'File too large. Maximum size is {self.max_upload_size // (1024*1024)}MB', 413)
+        self._maybe_sweep()
+        
+        upload_id = uuid.uuid4().hex
+        file_path = os.path.join(self.upload_folder, f"{upload_id}_{filename}")
+        open(file_path, 'wb').close()
+        
+        with self.lock:
+            self.uploads[upload_id] = {
+                'file_path': file_path,
+                'filename': filename,
+                'session_id': session_id,
+                'size': size,
+                'offset': 0,
+                'probed': False,
+                'last_active': time.monotonic(),
+                'lock': Lock()
+            }
+        logging.info(f"Created upload {upload_id} for {filename} ({size} bytes)")
+        return upload_id
+
+    def get(self, upload_id):
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+        if upload is None:
+            raise UploadError('Upload not found', 404)
+        return upload
+
+    def append(self, upload_id, offset, stream):
+        """Write a chunk from ``stream`` at ``offset``; returns the upload once it is complete, else None"""
+        upload = self.get(upload_id)
+        if not upload['lock'].acquire(blocking=False):
+            raise UploadError('A chunk for this upload is already in progress', 409)
+        
+        try:
+            with self.lock:
+                if upload_id not in self.uploads:
+                    raise UploadError('Upload not found', 404)
+            if offset != upload['offset']:
+                raise UploadError(f"Expected offset {upload['offset']}", 409)
+            
+            written = upload['offset']
+            try:
+                with open(upload['file_path'], 'r+b') as f:
+                    f.seek(written)
+                    for block in iter(lambda: stream.read(self.block_size), b''):
+                        if written + len(block) > upload['size']:
+                            raise UploadError('Received more data than the declared file size', 413)
+                        f.write(block)
+                        written += len(block)
+            finally:
+                # Only count bytes that reached the file, so the client resumes from the right place
+                upload['offset'] = written
+                upload['last_active'] = time.monotonic()
+            
+            if not upload['probed'] and (upload['offset'] >= self.header_probe_bytes or upload['offset'] == upload['size']):
+                self._probe_header(upload_id, upload)
+            
+            if upload['offset'] == upload['size']:
+                with self.lock:
+                    self.uploads.pop(upload_id, None)
+                return upload
+            return None
+        
+        finally:
+            upload['lock'].release()
+
+    def _probe_header(self, upload_id, upload):
+        """Reject non-audio uploads as soon as the container header has arrived"""
+        upload['probed'] = True
+        try:
+            probe = ffmpeg.probe(upload['file_path'])
+        except ffmpeg.Error:
+            # Some containers (e.g. m4a with a trailing moov atom) can't be probed until complete
+            logging.debug(f"Header probe inconclusive for upload {upload_id}")
+            return
+        
+        if not any(s.get('codec_type') == 'audio' for s in probe.get('streams', [])):
+            self.discard(upload_id)
+            raise UploadError('File does not contain an audio stream')
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self.last_sweep >= self.sweep_interval:
+            self.last_sweep = now
+            self.evict_expired(now)
+
+    def evict_expired(self, now=None):
+        """Drop uploads idle for longer than ttl and delete their spool files; returns how many"""
+        now = now or time.monotonic()
+        with self.lock:
+            expired = [upload_id for upload_id, upload in self.uploads.items()
+                       if now - upload['last_active'] > self.ttl and not upload['lock'].locked()]
+        for upload_id in expired:
+            logging.info(f"Expiring abandoned upload {upload_id}")
+            self.discard(upload_id)
+        return len(expired)
+
+    def discard(self, upload_id):
+        with self.lock:
+            upload = self.uploads.pop(upload_id, None)
+        if upload and os.path.exists(upload['file_path']):
+            os.unlink(upload['file_path'])
@@ -0,0 +1,248 @@
+import time
+import random
+import asyncio
+import logging
+from threading import Lock, Condition
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
+from metrics import LatencyHistogram
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+class TokenBucket:
+    """Client-side rate limiter: ``rate`` requests per second with bursts up to ``capacity``"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def _take(self):
+        """Take a token if one is available; otherwise return the seconds until one will be"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available; returns the seconds spent waiting"""
+        waited = 0.0
+        while delay := self._take():
+            time.sleep(delay)
+            waited += delay
+        return waited
+
+    async def acquire_async(self):
+        waited = 0.0
+        while delay := self._take():
+            await asyncio.sleep(delay)
+            waited += delay
+        return waited
+
+class UserConcurrencyLimit:
+    """At most ``limit`` concurrent operations per user; idle users hold no state.
+
+    Threads and event loop tasks share the same counts. Threads wait on a
+    condition; tasks park on a future that ``release`` resolves from whichever
+    thread frees a slot for their user, so nothing polls.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = {}
+        self.waiters = {}
+        self.condition = Condition()
+
+    def _try(self, user):
+        count = self.active.get(user, 0)
+        if count >= self.limit:
+            return False
+        self.active[user] = count + 1
+        return True
+
+    def acquire(self, user):
+        with self.condition:
+            while not self._try(user):
+                self.condition.wait()
+
+    async def acquire_async(self, user):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.condition:
+                if self._try(user):
+                    return
+                waiter = loop.create_future()
+                self.waiters.setdefault(user, []).append((loop, waiter))
+            try:
+                await waiter
+            finally:
+                with self.condition:
+                    waiting = self.waiters.get(user, [])
+                    if (loop, waiter) in waiting:
+                        waiting.remove((loop, waiter))
+                        if not waiting:
+                            del self.waiters[user]
+
+    def release(self, user):
+        with self.condition:
+            count = self.active[user] - 1
+            if count:
+                self.active[user] = count
+            else:
+                del self.active[user]
+            self.condition.notify_all()
+            # Every waiter retries, like notify_all, so a cancelled one can't swallow the wakeup
+            for loop, waiter in self.waiters.pop(user, []):
+                loop.call_soon_threadsafe(_wake, waiter)
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+class _Endpoint:
+    """Stands in for e.g. ``client.chat.completions`` so call sites keep the OpenAI shape"""
+
+    def __init__(self, upstream, name, create):
+        self._upstream = upstream
+        self._name = name
+        self._create = create
+
+    def create(self, **params):
+        return self._upstream.call(self._name, self._create, **params)
+
+class _Namespace:
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+class UpstreamClient:
+    """Wraps an OpenAI client with retries, rate limiting and latency metrics.
+
+    Transient failures (429, 5xx, connection errors and timeouts) are retried
+    with jittered exponential backoff, honouring Retry-After. All calls share
+    one token bucket, so concurrent jobs can't collectively exceed the rate.
+    Streaming calls are retried only until the stream has been opened.
+    """
+
+    def __init__(self, client, max_retries=5, base_delay=0.5, max_delay=30, requests_per_second=None):
+        self.client = client
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = TokenBucket(requests_per_second) if requests_per_second else None
+        self.histograms = {}
+        self.counters = {}
+        self.metrics_lock = Lock()
+        
+        self.chat = _Namespace(completions=_Endpoint(self, 'chat', client.chat.completions.create))
+        self.audio = _Namespace(transcriptions=_Endpoint(self, 'transcription', client.audio.transcriptions.create))
+
+    def _count(self, name, outcome):
+        with self.metrics_lock:
+            key = f"{name}_{outcome}"
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def _histogram(self, name):
+        with self.metrics_lock:
+            if name not in self.histograms:
+                self.histograms[name] = LatencyHistogram()
+            return self.histograms[name]
+
+    def _backoff(self, attempt, error):
+        retry_after = None
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get('retry-after'))
+            except (TypeError, ValueError):
+                pass
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        # Full jitter: spread retries from many jobs out instead of synchronizing them
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, name, create, **params):
+        for attempt in range(self.max_retries + 1):
+            if self.limiter:
+                self.limiter.acquire()
+            
+            # Uploaded files are consumed by each attempt
+            if hasattr(params.get('file'), 'seek'):
+                params['file'].seek(0)
+            
+            start = time.perf_counter()
+            try:
+                result = create(**params)
+                self._histogram(name).observe(time.perf_counter() - start)
+                self._count(name, 'ok')
+                return result
+            except RETRYABLE_ERRORS as e:
+                self._count(name, 'retry' if attempt < self.max_retries else 'failed')
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                logging.warning(f"Upstream {name} call failed ({type(e).__name__}), retrying in {delay:.1f}s "
+                                f"(attempt {attempt + 1} of {self.max_retries})")
+                time.sleep(delay)
+            except Exception:
+                self._count(name, 'failed')
+                raise
+
+    def stats(self):
+        with self.metrics_lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+        return {
+            'counters': counters,
+            'latency_seconds': {name: h.snapshot() for name, h in histograms.items()}
+        }
+
+class AsyncUpstreamClient(UpstreamClient):
+    """UpstreamClient for an ``AsyncOpenAI`` client: ``create`` calls are awaited and
+    backoff sleeps don't block the event loop. Shares the retry policy and metrics shape.
+    """
+
+    async def call(self, name, create, **params):
+        for attempt in range(self.max_retries + 1):
+            if self.limiter:
+                await self.limiter.acquire_async()
+            
+            start = time.perf_counter()
+            try:
+                result = await create(**params)
+                self._histogram(name).observe(time.perf_counter() - start)
+                self._count(name, 'ok')
+                return result
+            except RETRYABLE_ERRORS as e:
+                self._count(name, 'retry' if attempt < self.max_retries else 'failed')
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                logging.warning(f"Upstream {name} call failed ({type(e).__name__}), retrying in {delay:.1f}s "
+                                f"(attempt {attempt + 1} of {self.max_retries})")
+                await asyncio.sleep(delay)
+            except Exception:
+                self._count(name, 'failed')
+                raise
+
+def create_openai_client(timeout=120, max_connections=32):
+    """OpenAI client with a pooled keep-alive HTTP connection pool and no SDK-level retries"""
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=httpx.Timeout(timeout, connect=10)
+    )
+    return OpenAI(http_client=http_client, max_retries=0)
+
+def create_async_openai_client(timeout=120, max_connections=256):
+    """AsyncOpenAI client; one event loop can hold ``max_connections`` calls in flight"""
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=httpx.Timeout(timeout, connect=10)
+    )
+    return AsyncOpenAI(http_client=http_client, max_retries=0)
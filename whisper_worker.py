@@ -0,0 +1,24 @@
+"""Code that runs inside the local Whisper worker processes.
+
+Workers are spawned, and a spawned process imports the modules of the
+functions it is sent. This module is kept free of import-time side effects,
+and of imports beyond the standard library, so that is all a worker loads
+before its model.
+"""
+import io
+
+_model = None
+_options = {}
+
+def load_model(model_size, compute_type, cpu_threads, beam_size):
+    """Process pool initializer: load the model once per worker process"""
+    global _model, _options
+    from faster_whisper import WhisperModel
+    _model = WhisperModel(model_size, device='cpu', compute_type=compute_type, cpu_threads=cpu_threads)
+    _options = {'beam_size': beam_size}
+
+def transcribe(audio):
+    """Whisper's (start, end, text) segments for MP3 bytes or a file path"""
+    source = io.BytesIO(audio) if isinstance(audio, bytes) else audio
+    segments, _ = _model.transcribe(source, **_options)
+    return [(s.start, s.end, s.text) for s in segments]